@@ -0,0 +1,130 @@
+import json
+
+from .models import Anomaly, LogEntry
+
+# --- Decoder Backends ---
+# Fastest installed decoder wins; the stdlib is always there as a fallback
+DECODERS = {}
+ENCODERS = {}
+DECODE_ERRORS = (ValueError,)  # What any registered decoder raises on malformed input (orjson's is a ValueError)
+
+try:
+    import orjson
+    DECODERS['orjson'] = orjson.loads
+    ENCODERS['orjson'] = lambda obj: orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    pass
+
+try:
+    import msgspec
+    DECODERS['msgspec'] = msgspec.json.decode
+    DECODE_ERRORS += (msgspec.DecodeError,)  # Not a ValueError in every msgspec release
+    ENCODERS['msgspec'] = lambda obj: msgspec.json.encode(obj).decode('utf-8')
+except ImportError:
+    pass
+
+DECODERS['json'] = json.loads
+ENCODERS['json'] = lambda obj: json.dumps(obj, ensure_ascii=False)
+
+BACKEND = next(iter(DECODERS))
+loads = DECODERS[BACKEND]
+dumps = ENCODERS[BACKEND]
+
+# Length limits come straight from the model so the two can't drift apart
+MAX_LENGTHS = {
+    'ip': LogEntry._meta.get_field('ip_address').max_length,
+    'country': LogEntry._meta.get_field('country').max_length,
+    'url': LogEntry._meta.get_field('url').max_length,
+    'user_agent': LogEntry._meta.get_field('user_agent').max_length,
+}
+DETAILS_MAX_LENGTH = Anomaly._meta.get_field('details').max_length
+
+
+class InvalidLogEvent(ValueError):
+    pass
+
+
+def clip_details(text):
+    """Fits an anomaly's details (which may echo a whole URL or POST body) into Anomaly.details."""
+    return text[:DETAILS_MAX_LENGTH]
+
+
+def _text(data, key, default=''):
+    value = data.get(key)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise InvalidLogEvent(f"'{key}' must be a string")
+    max_length = MAX_LENGTHS.get(key)
+    return value[:max_length] if max_length else value
+
+
+class LogEvent:
+    """A validated log line as received by log_receiver."""
+
+    __slots__ = ('ip', 'country', 'url', 'status_code', 'post_data', 'user_agent', 'received_at', '_line')
+
+    def __init__(self, ip: str, country: str, url: str, status_code: int, post_data: str, user_agent: str):
+        self.ip = ip
+        self.country = country
+        self.url = url
+        self.status_code = status_code
+        self.post_data = post_data
+        self.user_agent = user_agent
+        self.received_at = None  # Set by log_receiver; shard workers may analyze the event much later
+        self._line = None
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise InvalidLogEvent("Log entry must be a JSON object")
+        ip = _text(data, 'ip')
+        if not ip:
+            raise InvalidLogEvent("'ip' is required")
+        status_code = data.get('status_code', 200)
+        if isinstance(status_code, bool):
+            raise InvalidLogEvent("'status_code' must be an integer")
+        try:
+            status_code = int(status_code)
+        except (TypeError, ValueError):
+            raise InvalidLogEvent("'status_code' must be an integer")
+        return cls(
+            ip=ip,
+            country=_text(data, 'country', 'Unknown'),
+            url=_text(data, 'url'),
+            status_code=status_code,
+            post_data=_text(data, 'post_data'),
+            user_agent=_text(data, 'user_agent'),
+        )
+
+    def as_dict(self):
+        return {
+            'ip': self.ip,
+            'country': self.country,
+            'url': self.url,
+            'status_code': self.status_code,
+            'post_data': self.post_data,
+            'user_agent': self.user_agent,
+        }
+
+    @property
+    def line(self):
+        # Serialised once and shared by every anomaly the event triggers
+        if self._line is None:
+            self._line = dumps(self.as_dict())
+        return self._line
+
+
+def decode_event(body, loads=loads):
+    try:
+        data = loads(body)
+    except DECODE_ERRORS:
+        raise InvalidLogEvent("Invalid JSON")
+    return LogEvent.from_dict(data)
+
+
+def decode_batch(body, loads=loads):
+    """Decodes an NDJSON body, one log entry per non-empty line."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return [decode_event(line, loads) for line in body.splitlines() if line.strip()]
@@ -0,0 +1,204 @@
+import hashlib
+import math
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q
+
+from .models import Anomaly, FingerprintBand, SourceFingerprint, ThreatSource
+from .timeline import url_template
+
+# --- Correlation Configuration ---
+MINHASH_SIZE = 32           # MinHash slots over the source's URL-template set
+LSH_BANDS = 8               # MINHASH_SIZE / LSH_BANDS slots per band
+MAX_UA_HASHES = 8           # Distinct user agents remembered per source
+MIN_REQUESTS = 5            # Sources with fewer requests are too noisy to cluster
+MAX_CANDIDATES = 50         # Candidate clusters found through shared buckets per update
+SIMILARITY_THRESHOLD = 0.8  # Weighted similarity to a cluster's representative needed to join it
+CLUSTER_MIN_SIZE = 3        # Sources needed before a cluster is treated as a campaign
+SUSPICIOUS_SCORE = 50       # Threat score at which a member is suspicious on its own
+CLUSTER_MIN_SUSPICIOUS = 2  # Individually suspicious members needed before a cluster is blocked
+CLUSTER_MEAN_SCORE = 40     # Mean member threat score at which a campaign is blocked
+
+_PRIME = (1 << 61) - 1
+_SEEDS = [
+    (int.from_bytes(hashlib.md5(f"a{i}".encode()).digest()[:8], 'big') % _PRIME or 1,
+     int.from_bytes(hashlib.md5(f"b{i}".encode()).digest()[:8], 'big') % _PRIME)
+    for i in range(MINHASH_SIZE)
+]
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _timing_bucket(time_delta_ms):
+    return str(min(int(math.log2(time_delta_ms + 1)), 24))
+
+
+# --- Fingerprint ---
+def update_fingerprint(fingerprint, event, time_delta_ms):
+    """Folds one event into the fingerprint in place; every part is updatable without the history."""
+    fingerprint.request_count += 1
+
+    ua_hash = format(_hash64(event.user_agent.lower()), 'x')
+    if ua_hash not in fingerprint.ua_hashes and len(fingerprint.ua_hashes) < MAX_UA_HASHES:
+        fingerprint.ua_hashes.append(ua_hash)
+
+    template_hash = _hash64(url_template(event.url))
+    slots = [(a * template_hash + b) % _PRIME for a, b in _SEEDS]
+    if fingerprint.minhash:
+        fingerprint.minhash = [min(old, new) for old, new in zip(fingerprint.minhash, slots)]
+    else:
+        fingerprint.minhash = slots
+
+    status_class = f"{event.status_code // 100}xx"
+    fingerprint.status_mix[status_class] = fingerprint.status_mix.get(status_class, 0) + 1
+
+    if time_delta_ms is not None:
+        bucket = _timing_bucket(time_delta_ms)
+        fingerprint.timing_histogram[bucket] = fingerprint.timing_histogram.get(bucket, 0) + 1
+
+
+def _median_bucket(histogram):
+    total = sum(histogram.values())
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen * 2 >= total:
+            return int(bucket)
+    return None
+
+
+def band_keys(fingerprint):
+    rows = MINHASH_SIZE // LSH_BANDS
+    return [
+        f"{band}:" + hashlib.md5(','.join(map(str, fingerprint.minhash[band * rows:(band + 1) * rows])).encode()).hexdigest()[:24]
+        for band in range(LSH_BANDS)
+    ]
+
+
+def similarity(a, b):
+    minhash = sum(x == y for x, y in zip(a.minhash, b.minhash)) / MINHASH_SIZE
+
+    ua_a, ua_b = set(a.ua_hashes), set(b.ua_hashes)
+    ua = len(ua_a & ua_b) / len(ua_a | ua_b) if ua_a | ua_b else 0
+
+    total_a, total_b = sum(a.status_mix.values()) or 1, sum(b.status_mix.values()) or 1
+    status = 1 - sum(abs(a.status_mix.get(k, 0) / total_a - b.status_mix.get(k, 0) / total_b)
+                     for k in set(a.status_mix) | set(b.status_mix)) / 2
+
+    median_a, median_b = _median_bucket(a.timing_histogram), _median_bucket(b.timing_histogram)
+    timing = 0 if median_a is None or median_b is None else max(0, 1 - abs(median_a - median_b) / 4)
+
+    return 0.4 * minhash + 0.2 * ua + 0.2 * status + 0.2 * timing
+
+
+# --- Clustering ---
+def _rebucket(fingerprint, keys):
+    FingerprintBand.objects.filter(fingerprint=fingerprint).delete()
+    FingerprintBand.objects.bulk_create([FingerprintBand(fingerprint=fingerprint, band_key=key) for key in keys])
+
+
+def _join_cluster(fingerprint, keys):
+    """Moves the fingerprint into the cluster whose representative it most resembles, or into one of its own.
+
+    A cluster's representative is the fingerprint it was founded on (id == cluster_id). Members are only ever
+    compared with it, never with each other, so a cluster cannot grow by chaining one near neighbour to the next.
+    """
+    if fingerprint.clustered and fingerprint.cluster_id == fingerprint.id:
+        if SourceFingerprint.objects.filter(cluster_id=fingerprint.id).exclude(id=fingerprint.id).exists():
+            return  # Representatives stay put, or their members would no longer resemble them
+        fingerprint.clustered = False
+
+    # LSH: only clusters with a member sharing at least one band are ever compared, never the whole table
+    cluster_ids = set(FingerprintBand.objects.filter(band_key__in=keys)
+                      .exclude(fingerprint=fingerprint)
+                      .values_list('fingerprint__cluster_id', flat=True).distinct()[:MAX_CANDIDATES])
+    cluster_ids.add(fingerprint.cluster_id)  # Re-checked in case the fingerprint drifted away from it
+    representatives = (SourceFingerprint.objects.filter(id__in=cluster_ids, cluster_id=F('id'), request_count__gte=MIN_REQUESTS)
+                       .exclude(id=fingerprint.id))
+
+    best, best_similarity = None, SIMILARITY_THRESHOLD
+    for representative in representatives:
+        score = similarity(fingerprint, representative)
+        if score >= best_similarity:
+            best, best_similarity = representative, score
+
+    if best is None:
+        fingerprint.cluster_id = fingerprint.id
+        fingerprint.clustered = False
+        return
+    fingerprint.cluster_id = best.id
+    fingerprint.clustered = True
+    if not best.clustered:
+        SourceFingerprint.objects.filter(id=best.id).update(clustered=True)
+
+
+def _score_cluster(cluster_id):
+    # Per-member measures, so a cluster of ordinary users never adds up to a campaign just by being large
+    members = ThreatSource.objects.filter(fingerprint__cluster_id=cluster_id)
+    stats = members.aggregate(
+        size=Count('id'),
+        mean=Avg('threat_score'),
+        suspicious=Count('id', filter=Q(threat_score__gte=SUSPICIOUS_SCORE)),
+    )
+    if (stats['size'] < CLUSTER_MIN_SIZE or stats['suspicious'] < CLUSTER_MIN_SUSPICIOUS
+            or stats['mean'] < CLUSTER_MEAN_SCORE):
+        return []
+
+    # Members without a malicious signal of their own are left active
+    newly_blocked = list(members.filter(status='active', threat_score__gt=0))
+    if newly_blocked:
+        details = (f"Campaign cluster {cluster_id}: {stats['size']} sources, {stats['suspicious']} suspicious, "
+                   f"mean score {stats['mean']:.0f}")
+        members.filter(id__in=[t.id for t in newly_blocked]).update(status='blocked')
+        Anomaly.objects.bulk_create([
+            Anomaly(threat_source=threat, reason='Campaign Correlation', score_added=0, attacked_url='', details=details, log_entry='')
+            for threat in newly_blocked
+        ])
+    return newly_blocked
+
+
+def correlate(threat, events):
+    """Folds (event, time_delta_ms) pairs from one source into its fingerprint and blocks its cluster if it
+    scores as a campaign.
+
+    Returns True when the source itself ended up blocked by the cluster.
+    """
+    # get_or_create absorbs the IntegrityError when two requests from a new IP race to the insert
+    fingerprint, created = SourceFingerprint.objects.get_or_create(threat_source=threat)
+    if created:
+        fingerprint.cluster_id = fingerprint.id
+
+    old_keys = band_keys(fingerprint) if fingerprint.minhash else []
+    for event, time_delta_ms in events:
+        update_fingerprint(fingerprint, event, time_delta_ms)
+    if fingerprint.request_count < MIN_REQUESTS:
+        fingerprint.save()
+        return False
+
+    keys = band_keys(fingerprint)
+    # Re-bucketing and neighbour search only happen when the URL-template signature moves
+    moved = keys != old_keys or fingerprint.request_count - len(events) < MIN_REQUESTS
+    # Clusters of one are never scored, and a cluster is only rescored when it or this member's score changed
+    if not moved and not (fingerprint.clustered and fingerprint.scored_threat_score != threat.threat_score):
+        fingerprint.save()
+        return False
+
+    with transaction.atomic():
+        cluster_id = fingerprint.cluster_id
+        if moved:
+            _rebucket(fingerprint, keys)
+            _join_cluster(fingerprint, keys)
+        rescore = fingerprint.clustered and (fingerprint.cluster_id != cluster_id or fingerprint.scored_threat_score != threat.threat_score)
+        if rescore:
+            fingerprint.scored_threat_score = threat.threat_score
+        fingerprint.save()
+        blocked = _score_cluster(fingerprint.cluster_id) if rescore else []
+    return any(t.id == threat.id for t in blocked)
+
+
+def correlate_pending(pending):
+    """Correlates what analyze_log_entry deferred for a micro-batch: one fingerprint update per source, not per event."""
+    for threat, events in pending.values():
+        correlate(threat, events)
@@ -0,0 +1,181 @@
+import csv
+import zlib
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .codec import dumps
+from .models import Anomaly, LogEntry
+
+# --- Export Configuration ---
+CHUNK_SIZE = 2000             # Rows fetched from the database cursor per round trip
+FLUSH_BYTES = 64 * 1024       # Output is buffered up to this size before being handed to the response
+FORMATS = ('ndjson', 'csv', 'cef')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv', 'cef': 'text/plain'}
+
+# values_list() columns per export kind; rows are never turned into model instances
+COLUMNS = {
+    'logs': (
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('ip_address', 'ip_address'),
+        ('country', 'country'),
+        ('url', 'url'),
+        ('status_code', 'status_code'),
+        ('user_agent', 'user_agent'),
+        ('time_delta_ms', 'time_delta_ms'),
+    ),
+    'anomalies': (
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('ip_address', 'threat_source__ip_address'),
+        ('country', 'threat_source__country'),
+        ('reason', 'reason'),
+        ('score_added', 'score_added'),
+        ('attacked_url', 'attacked_url'),
+        ('details', 'details'),
+    ),
+}
+
+
+class InvalidExport(ValueError):
+    pass
+
+
+def _parse_time(value, name):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:  # Well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        raise InvalidExport(f"'{name}' must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def build_queryset(kind, since=None, until=None, reason=None, status=None, status_code=None, country=None, after=None):
+    """Filtered values_list() for an export, ordered by id so `after` can resume an interrupted one."""
+    if kind == 'logs':
+        queryset = LogEntry.objects.all()
+        country_field, status_field = 'country', 'threat_source__status'
+    elif kind == 'anomalies':
+        queryset = Anomaly.objects.all()
+        country_field, status_field = 'threat_source__country', 'threat_source__status'
+    else:
+        raise InvalidExport("Export kind must be 'logs' or 'anomalies'")
+
+    if since:
+        queryset = queryset.filter(timestamp__gte=_parse_time(since, 'since'))
+    if until:
+        queryset = queryset.filter(timestamp__lt=_parse_time(until, 'until'))
+    if country:
+        queryset = queryset.filter(**{country_field: country})
+    if status:
+        queryset = queryset.filter(**{status_field: status})
+    if reason:
+        if kind != 'anomalies':
+            raise InvalidExport("'reason' only applies to anomalies")
+        queryset = queryset.filter(reason=reason)
+    if status_code:
+        if kind != 'logs':
+            raise InvalidExport("'status_code' only applies to logs")
+        try:
+            queryset = queryset.filter(status_code=int(status_code))
+        except ValueError:
+            raise InvalidExport("'status_code' must be an integer")
+    if after:
+        try:
+            queryset = queryset.filter(id__gt=int(after))
+        except ValueError:
+            raise InvalidExport("'after' must be an integer id")
+
+    return queryset.order_by('id').values_list(*(field for _, field in COLUMNS[kind]))
+
+
+# --- Row Formatters ---
+class _Echo:
+    """csv.writer target that hands back the formatted line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _cef_header(value):
+    return str(value).replace('\\', '\\\\').replace('|', '\\|')
+
+
+def _cef_value(value):
+    return str(value).replace('\\', '\\\\').replace('=', '\\=').replace('\r', '').replace('\n', '\\n')
+
+
+def _cef_line(kind, row):
+    # rt is epoch milliseconds, the form every CEF consumer parses without a date format
+    rt = int(row['timestamp'].timestamp() * 1000)
+    if kind == 'logs':
+        signature, name, severity = 'log', 'HTTP Request', 1
+        extension = {
+            'externalId': row['id'], 'rt': rt, 'src': row['ip_address'], 'cs1': row['country'],
+            'request': row['url'], 'outcome': row['status_code'],
+            'requestClientApplication': row['user_agent'], 'cn1': row['time_delta_ms'],
+        }
+        labels = {'cs1': 'country', 'cn1': 'timeDeltaMs'}
+    else:
+        signature, name = row['reason'], row['reason']
+        severity = min(10, max(1, row['score_added'] // 10))
+        extension = {
+            'externalId': row['id'], 'rt': rt, 'src': row['ip_address'], 'cs1': row['country'],
+            'request': row['attacked_url'], 'cn1': row['score_added'], 'msg': row['details'],
+        }
+        labels = {'cs1': 'country', 'cn1': 'scoreAdded'}
+    fields = []
+    for key, value in extension.items():
+        if value is None or value == '':
+            continue  # A label without its value would mislabel whatever the consumer finds next
+        if key in labels:
+            fields.append(f"{key}Label={_cef_value(labels[key])}")
+        fields.append(f"{key}={_cef_value(value)}")
+    return f"CEF:0|FixIt|LogAnalyzer|1.0|{_cef_header(signature)}|{_cef_header(name)}|{severity}|{' '.join(fields)}\n"
+
+
+def iter_export(kind, queryset, fmt='ndjson', compress=False):
+    """Returns an iterator of byte chunks; memory use is bounded by CHUNK_SIZE rows, not by the result size."""
+    if fmt not in FORMATS:
+        raise InvalidExport(f"Format must be one of: {', '.join(FORMATS)}")
+    return _stream(kind, queryset, fmt, compress)
+
+
+def _stream(kind, queryset, fmt, compress):
+    names = [name for name, _ in COLUMNS[kind]]
+    writer = csv.writer(_Echo())
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 emits a gzip container
+
+    def lines():
+        if fmt == 'csv':
+            yield writer.writerow(names)
+        for values in queryset.iterator(chunk_size=CHUNK_SIZE):
+            row = dict(zip(names, values))
+            if fmt == 'cef':
+                yield _cef_line(kind, row)
+                continue
+            row['timestamp'] = row['timestamp'].isoformat()
+            if fmt == 'ndjson':
+                yield dumps(row) + '\n'
+            else:
+                yield writer.writerow(row.values())
+
+    buffer = []
+    size = 0
+    for line in lines():
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            data = ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+            chunk = compressor.compress(data) if compressor else data
+            if chunk:
+                yield chunk
+    data = ''.join(buffer).encode('utf-8')
+    chunk = compressor.compress(data) + compressor.flush() if compressor else data
+    if chunk:
+        yield chunk
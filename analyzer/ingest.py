@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from .codec import decode_event, InvalidLogEvent
+from .services import analyze_log_entry
+from .sharding import get_sharded_analyzer, ShardUnavailable
+
+# Kept apart from views.py so the lean ingest profile (fixit_project.ingest_urls) imports only what it serves
+
+@csrf_exempt
+def log_receiver(request):
+    if request.method == 'POST':
+        try:
+            event = decode_event(request.body)
+        except InvalidLogEvent as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        event.received_at = timezone.now()
+        if settings.ANALYZER_SHARDS:
+            # Route the event to the shard that owns its IP
+            try:
+                get_sharded_analyzer().submit(event)
+            except ShardUnavailable as e:
+                return JsonResponse({"error": str(e)}, status=503)
+        else:
+            analyze_log_entry(event)
+        return JsonResponse({"status": "ok"})
+    return JsonResponse({"error": "Only POST method allowed"}, status=405)
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.export import build_queryset, iter_export, InvalidExport, FORMATS
+
+
+class Command(BaseCommand):
+    help = "Streams logs or anomalies as NDJSON, CSV or CEF for SIEM ingestion."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=('logs', 'anomalies'))
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', '-o', help="File to write to; defaults to stdout")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output on the fly")
+        parser.add_argument('--since', help="ISO 8601 datetime, inclusive")
+        parser.add_argument('--until', help="ISO 8601 datetime, exclusive")
+        parser.add_argument('--reason', help="Anomaly reason (anomalies only)")
+        parser.add_argument('--status', choices=('active', 'blocked'), help="Threat source status")
+        parser.add_argument('--status-code', help="HTTP status code (logs only)")
+        parser.add_argument('--country')
+        parser.add_argument('--after', help="Resume after this row id (the last id already exported)")
+
+    def handle(self, *args, **options):
+        try:
+            queryset = build_queryset(
+                options['kind'],
+                since=options['since'],
+                until=options['until'],
+                reason=options['reason'],
+                status=options['status'],
+                status_code=options['status_code'],
+                country=options['country'],
+                after=options['after'],
+            )
+            chunks = iter_export(options['kind'], queryset, options['fmt'], options['gzip'])
+        except InvalidExport as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
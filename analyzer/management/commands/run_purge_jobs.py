@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analyzer.purge import PURGE_POLL_SECONDS, claimable_purge_jobs, run_purge_job
+
+
+class Command(BaseCommand):
+    help = "Runs pending purge jobs and resumes running ones whose worker died."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run what is claimable now, then exit")
+
+    def handle(self, *args, **options):
+        while True:
+            for job_id in claimable_purge_jobs():
+                if run_purge_job(job_id):
+                    self.stdout.write(f"Purge job {job_id} finished")
+            if options['once']:
+                break
+            time.sleep(PURGE_POLL_SECONDS)
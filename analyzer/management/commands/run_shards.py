@@ -0,0 +1,27 @@
+import atexit
+import signal
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.sharding import ShardedAnalyzer, serve_forever
+
+
+class Command(BaseCommand):
+    help = "Runs the host's analyzer shard pool; log_receiver routes events to it when ANALYZER_SHARDS > 0."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=settings.ANALYZER_SHARDS or None)
+        parser.add_argument('--socket', default=settings.ANALYZER_SHARD_SOCKET)
+
+    def handle(self, *args, **options):
+        if not options['shards'] or options['shards'] < 1:
+            raise CommandError("Set ANALYZER_SHARDS or pass --shards")
+
+        analyzer = ShardedAnalyzer(options['shards']).start().wait_ready()
+        # Lets workers drain their queues before the process exits
+        atexit.register(analyzer.stop, 10)
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        self.stdout.write(f"{analyzer.shard_count} shards listening on {options['socket']}")
+        serve_forever(analyzer, options['socket'])
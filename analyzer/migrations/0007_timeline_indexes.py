@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0006_aianalysis'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['threat_source', 'timestamp', 'id'], name='anomaly_source_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['ip_address', 'timestamp', 'id'], name='logentry_ip_time_idx'),
+        ),
+    ]
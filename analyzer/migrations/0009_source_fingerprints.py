@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0008_purgejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_count', models.IntegerField(default=0)),
+                ('ua_hashes', models.JSONField(default=list)),
+                ('minhash', models.JSONField(default=list)),
+                ('status_mix', models.JSONField(default=dict)),
+                ('timing_histogram', models.JSONField(default=dict)),
+                ('cluster_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('threat_source', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint', to='analyzer.threatsource')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band_key', models.CharField(db_index=True, max_length=64)),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='analyzer.sourcefingerprint')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_clustered(apps, schema_editor):
+    SourceFingerprint = apps.get_model('analyzer', 'SourceFingerprint')
+    shared = (SourceFingerprint.objects.values('cluster_id').annotate(size=Count('id'))
+              .filter(size__gt=1).values_list('cluster_id', flat=True))
+    SourceFingerprint.objects.filter(cluster_id__in=list(shared)).update(clustered=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0010_purgejob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcefingerprint',
+            name='clustered',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='sourcefingerprint',
+            name='scored_threat_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_clustered, migrations.RunPython.noop),
+    ]
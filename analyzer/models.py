@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class ThreatSource(models.Model):
     STATUS_CHOICES = (
@@ -10,20 +11,25 @@ class ThreatSource(models.Model):
     country = models.CharField(max_length=50, blank=True, null=True)
     threat_score = models.IntegerField(default=0)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
-    last_seen = models.DateTimeField(auto_now=True)
+    last_seen = models.DateTimeField(default=timezone.now)  # Set by analyze_log_entry to when the event was received
 
     def __str__(self):
         return f'{self.ip_address} ({self.country}) - Score: {self.threat_score}'
 
 class Anomaly(models.Model):
     threat_source = models.ForeignKey(ThreatSource, on_delete=models.CASCADE, related_name='anomalies')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     reason = models.CharField(max_length=100)
     score_added = models.IntegerField()
     attacked_url = models.CharField(max_length=2048)
     details = models.CharField(max_length=255, blank=True, null=True)
     log_entry = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['threat_source', 'timestamp', 'id'], name='anomaly_source_time_idx'),
+        ]
+
     def __str__(self):
         return f"Anomaly for {self.threat_source.ip_address} ({self.reason})"
 
@@ -34,9 +40,14 @@ class LogEntry(models.Model):
     url = models.CharField(max_length=2048)
     status_code = models.IntegerField()
     user_agent = models.CharField(max_length=255, blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     time_delta_ms = models.IntegerField(null=True, blank=True) # Новое поле
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['ip_address', 'timestamp', 'id'], name='logentry_ip_time_idx'),
+        ]
+
     def __str__(self):
         return f"Log from {self.ip_address} to {self.url} at {self.timestamp}"
 
@@ -47,4 +58,54 @@ class AIAnalysis(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"AI Analysis for {self.widget_key} updated at {self.updated_at}"
\ No newline at end of file
+        return f"AI Analysis for {self.widget_key} updated at {self.updated_at}"
+
+class SourceFingerprint(models.Model):
+    threat_source = models.OneToOneField(ThreatSource, on_delete=models.CASCADE, related_name='fingerprint')
+    request_count = models.IntegerField(default=0)
+    ua_hashes = models.JSONField(default=list)
+    minhash = models.JSONField(default=list)
+    status_mix = models.JSONField(default=dict)
+    timing_histogram = models.JSONField(default=dict)
+    cluster_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    clustered = models.BooleanField(default=False)  # Shares its cluster with at least one other source
+    scored_threat_score = models.IntegerField(null=True, blank=True)  # Threat score when the cluster was last scored
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Fingerprint for {self.threat_source.ip_address} (cluster {self.cluster_id})"
+
+class FingerprintBand(models.Model):
+    fingerprint = models.ForeignKey(SourceFingerprint, on_delete=models.CASCADE, related_name='bands')
+    band_key = models.CharField(max_length=64, db_index=True)
+
+    def __str__(self):
+        return f"{self.band_key} -> {self.fingerprint_id}"
+
+class PurgeJob(models.Model):
+    KIND_CHOICES = (
+        ('reset', 'Full reset'),
+        ('ip', 'Per-IP purge'),
+        ('range', 'Time-range purge'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    ip_address = models.CharField(max_length=45, blank=True, null=True)
+    since = models.DateTimeField(blank=True, null=True)
+    until = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.BigIntegerField(default=0)
+    deleted_rows = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)  # Bumped per chunk by the worker that owns the job
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Purge {self.kind} ({self.status}) - {self.deleted_rows}/{self.total_rows}"
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AIAnalysis, Anomaly, FingerprintBand, LogEntry, PurgeJob, SourceFingerprint, ThreatSource
+
+logger = logging.getLogger(__name__)
+
+# --- Purge Configuration ---
+PURGE_CHUNK_SIZE = 5000     # Rows deleted per transaction; bounds how long ingestion waits on the lock
+PURGE_PAUSE_SECONDS = 0.01  # Gap between chunks so queued ingest writes get the lock
+PURGE_STALE_SECONDS = 120   # A running job without a heartbeat for this long lost its worker and is resumed
+PURGE_POLL_SECONDS = 2      # How often run_purge_jobs looks for new or orphaned jobs
+
+
+def _raw_delete_ids(model, ids):
+    # Skips the delete collector: no related-object loading, no signals, one DELETE ... WHERE id IN
+    if not ids:
+        return 0
+    return model.objects.filter(id__in=ids)._raw_delete(connection.alias)
+
+
+def _delete_sources(ids):
+    # Logs or anomalies ingested after their table was purged would break the FK, so sweep them here too
+    with transaction.atomic():
+        deleted = Anomaly.objects.filter(threat_source_id__in=ids)._raw_delete(connection.alias)
+        deleted += LogEntry.objects.filter(threat_source_id__in=ids)._raw_delete(connection.alias)
+        deleted += FingerprintBand.objects.filter(fingerprint__threat_source_id__in=ids)._raw_delete(connection.alias)
+        deleted += SourceFingerprint.objects.filter(threat_source_id__in=ids)._raw_delete(connection.alias)
+        return deleted + _raw_delete_ids(ThreatSource, ids)
+
+
+def _purge_querysets(job):
+    """The (queryset, model) pairs a job deletes, children before the ThreatSource rows they reference."""
+    if job.kind == 'reset':
+        return [
+            (Anomaly.objects.all(), Anomaly),
+            (LogEntry.objects.all(), LogEntry),
+            (FingerprintBand.objects.all(), FingerprintBand),
+            (SourceFingerprint.objects.all(), SourceFingerprint),
+            (ThreatSource.objects.all(), ThreatSource),
+            (AIAnalysis.objects.all(), AIAnalysis),
+        ]
+    if job.kind == 'ip':
+        return [
+            (Anomaly.objects.filter(threat_source__ip_address=job.ip_address), Anomaly),
+            (LogEntry.objects.filter(ip_address=job.ip_address), LogEntry),
+            (FingerprintBand.objects.filter(fingerprint__threat_source__ip_address=job.ip_address), FingerprintBand),
+            (SourceFingerprint.objects.filter(threat_source__ip_address=job.ip_address), SourceFingerprint),
+            (ThreatSource.objects.filter(ip_address=job.ip_address), ThreatSource),
+        ]
+    # Time-range purge keeps ThreatSource rows and their scores
+    querysets = []
+    for model in (Anomaly, LogEntry):
+        queryset = model.objects.all()
+        if job.since:
+            queryset = queryset.filter(timestamp__gte=job.since)
+        if job.until:
+            queryset = queryset.filter(timestamp__lt=job.until)
+        querysets.append((queryset, model))
+    return querysets
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=PURGE_STALE_SECONDS)
+    return Q(status='pending') | Q(status='running') & (Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True))
+
+
+def claimable_purge_jobs():
+    """Ids of pending jobs and of running jobs whose worker stopped heartbeating, oldest first."""
+    return list(PurgeJob.objects.filter(_claimable()).order_by('id').values_list('id', flat=True))
+
+
+def claim_purge_job(job_id):
+    """Marks a pending or orphaned job as running; returns the job, or None if another worker owns it."""
+    if not PurgeJob.objects.filter(_claimable(), id=job_id).update(status='running', heartbeat_at=timezone.now()):
+        return None
+    return PurgeJob.objects.get(id=job_id)
+
+
+def run_purge_job(job_id):
+    """Claims and runs a job, picking up where an interrupted run stopped. Returns False if it couldn't claim it."""
+    job = claim_purge_job(job_id)
+    if job is None:
+        return False
+    try:
+        querysets = _purge_querysets(job)
+        # Recounted on every (re)start: what earlier runs deleted plus what is left
+        job.total_rows = job.deleted_rows + sum(queryset.count() for queryset, _ in querysets)
+        job.save(update_fields=['total_rows'])
+
+        for queryset, model in querysets:
+            while True:
+                ids = list(queryset.order_by('id').values_list('id', flat=True)[:PURGE_CHUNK_SIZE])
+                if not ids:
+                    break
+                if model is ThreatSource:
+                    deleted = _delete_sources(ids)
+                else:
+                    deleted = _raw_delete_ids(model, ids)
+                job.deleted_rows += deleted
+                # Rows ingested after the count are deleted too, so the total only ever grows to match
+                job.total_rows = max(job.total_rows, job.deleted_rows)
+                heartbeat = timezone.now()
+                owned = PurgeJob.objects.filter(id=job.id, heartbeat_at=job.heartbeat_at).update(
+                    deleted_rows=job.deleted_rows, total_rows=job.total_rows, heartbeat_at=heartbeat
+                )
+                if not owned:
+                    logger.warning(f"Purge job {job.id} was taken over by another worker; stopping")
+                    return False
+                job.heartbeat_at = heartbeat
+                time.sleep(PURGE_PAUSE_SECONDS)
+
+        job.status = 'done'
+    except Exception as e:
+        logger.error(f"Purge job {job.id} failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'total_rows', 'finished_at'])
+    return True
+
+
+def _run_in_background(job_id):
+    try:
+        run_purge_job(job_id)
+    finally:
+        connection.close()
+
+
+def start_purge_job(kind, ip_address=None, since=None, until=None):
+    """Records a purge job and runs it on a background thread; poll PurgeJob for progress.
+
+    If this process dies mid-purge, `manage.py run_purge_jobs` resumes the job once its heartbeat goes stale.
+    """
+    job = PurgeJob.objects.create(kind=kind, ip_address=ip_address, since=since, until=until)
+    threading.Thread(target=_run_in_background, args=(job.id,), name=f"purge-{job.id}", daemon=True).start()
+    return job
@@ -1,6 +1,8 @@
 from .models import ThreatSource, Anomaly, LogEntry
-import json
+from .codec import LogEvent, clip_details
+from .correlation import correlate
 import re
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 
@@ -45,30 +47,35 @@ def luhn_checksum(card_number):
     except (ValueError, TypeError):
         return False
 
-def analyze_log_entry(log_data):
-    ip_address = log_data.get('ip')
-    if not ip_address:
-        return
+def analyze_log_entry(log_data, pending=None):
+    if not isinstance(log_data, LogEvent):
+        if not log_data.get('ip'):
+            return
+        log_data = LogEvent.from_dict(log_data)
+    ip_address = log_data.ip
+
+    # Timed from when log_receiver got the event, not when a shard worker gets round to it
+    now = log_data.received_at or timezone.now()
 
     threat, created = ThreatSource.objects.get_or_create(
         ip_address=ip_address,
-        defaults={'country': log_data.get('country', 'Unknown')}
+        defaults={'country': log_data.country, 'last_seen': now}
     )
 
     # --- Score Decay Logic ---
-    if not created and (timezone.now() - threat.last_seen) > timedelta(hours=SCORE_DECAY_HOURS):
+    if not created and (now - threat.last_seen) > timedelta(hours=SCORE_DECAY_HOURS):
         threat.threat_score = max(0, threat.threat_score - SCORE_DECAY_AMOUNT)
 
     # --- Time Delta Calculation ---
-    now = timezone.now()
     time_delta = now - threat.last_seen
-    time_delta_ms = int(time_delta.total_seconds() * 1000)
+    time_delta_ms = max(0, int(time_delta.total_seconds() * 1000))
+    threat.last_seen = max(threat.last_seen, now)
 
-    url = log_data.get('url', '')
-    status_code = int(log_data.get('status_code', 200))
-    user_agent = log_data.get('user_agent', '')
-    post_data = log_data.get('post_data', '')
-    log_line = json.dumps(log_data)
+    url = log_data.url
+    status_code = log_data.status_code
+    user_agent = log_data.user_agent
+    post_data = log_data.post_data
+    log_line = log_data.line
 
     LogEntry.objects.create(
         threat_source=threat,
@@ -77,11 +84,12 @@ def analyze_log_entry(log_data):
         url=url,
         status_code=status_code, 
         user_agent=user_agent,
+        timestamp=now,
         time_delta_ms=time_delta_ms if not created else None
     )
 
     if threat.status == 'blocked':
-        threat.save() # Update last_seen
+        threat.save(update_fields=['threat_score', 'last_seen']) # Update last_seen
         return
 
     # --- Professional Analysis Rules ---
@@ -89,47 +97,61 @@ def analyze_log_entry(log_data):
     if not created and time_delta_ms < MIN_REQUEST_DELTA_MS:
         score = 25
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='Robotic Activity', score_added=score, attacked_url=url, details=f"Time between requests: {time_delta_ms}ms", log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='Robotic Activity', score_added=score, attacked_url=url, details=f"Time between requests: {time_delta_ms}ms", log_entry=log_line)
 
     # Rule 2: Malicious User-Agent
     if any(bad_ua in user_agent.lower() for bad_ua in BAD_USER_AGENTS):
         score = 40 # Increased score
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='Malicious Scanner UA', score_added=score, attacked_url=url, details=user_agent, log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='Malicious Scanner UA', score_added=score, attacked_url=url, details=clip_details(user_agent), log_entry=log_line)
 
     # Rule 3: Path Scanning with Severity
     for pattern, score in PATH_SEVERITY_MAP.items():
         if pattern.search(url):
             threat.threat_score += score
-            Anomaly.objects.create(threat_source=threat, reason='Path Scanning', score_added=score, attacked_url=url, details=f"Matched pattern: {pattern.pattern}", log_entry=log_line)
+            Anomaly.objects.create(threat_source=threat, timestamp=now, reason='Path Scanning', score_added=score, attacked_url=url, details=f"Matched pattern: {pattern.pattern}", log_entry=log_line)
             break # Stop after first match
 
     # Rule 4: SQL Injection Attempts (in URL or POST data)
     if SQLI_PATTERNS.search(url) or SQLI_PATTERNS.search(post_data):
         score = 80 # High severity
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='SQL Injection Attempt', score_added=score, attacked_url=url, details=f"Payload: {url if SQLI_PATTERNS.search(url) else post_data}", log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='SQL Injection Attempt', score_added=score, attacked_url=url, details=clip_details(f"Payload: {url if SQLI_PATTERNS.search(url) else post_data}"), log_entry=log_line)
 
     # Rule 5: XSS Attempts (in URL or POST data)
     if XSS_PATTERNS.search(url) or XSS_PATTERNS.search(post_data):
         score = 60 # High severity
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='XSS Attempt', score_added=score, attacked_url=url, details=f"Payload: {url if XSS_PATTERNS.search(url) else post_data}", log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='XSS Attempt', score_added=score, attacked_url=url, details=clip_details(f"Payload: {url if XSS_PATTERNS.search(url) else post_data}"), log_entry=log_line)
 
     # Rule 6: Brute-force on login
     if 'login' in url and status_code == 401:
         score = 15
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='Login Brute-force', score_added=score, attacked_url=url, details="Failed login attempt", log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='Login Brute-force', score_added=score, attacked_url=url, details="Failed login attempt", log_entry=log_line)
 
     # Rule 7: Invalid Card Number (Luhn check)
     if 'payment' in url and post_data and not luhn_checksum(post_data):
         score = 30
         threat.threat_score += score
-        Anomaly.objects.create(threat_source=threat, reason='Invalid Card Number', score_added=score, attacked_url=url, details=f"Failed Luhn check for: {post_data}", log_entry=log_line)
+        Anomaly.objects.create(threat_source=threat, timestamp=now, reason='Invalid Card Number', score_added=score, attacked_url=url, details=clip_details(f"Failed Luhn check for: {post_data}"), log_entry=log_line)
 
     # --- Finalization ---
+    # Status is only written on the transition, so a campaign block made elsewhere is never reverted by a stale copy
+    update_fields = ['threat_score', 'last_seen']
     if threat.threat_score >= 100:
         threat.status = 'blocked'
-
-    threat.save()
+        update_fields.append('status')
+
+    threat.save(update_fields=update_fields)
+
+    # --- Campaign Correlation ---
+    if settings.ANALYZER_CORRELATION and threat.status == 'active':
+        timing = time_delta_ms if not created else None
+        if pending is not None:
+            # Shard workers pass `pending` and correlate the whole micro-batch once it is written
+            entry = pending.setdefault(threat.id, [threat, []])
+            entry[0] = threat
+            entry[1].append((log_data, timing))
+        elif correlate(threat, [(log_data, timing)]):
+            threat.status = 'blocked'
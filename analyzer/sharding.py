@@ -0,0 +1,262 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Sharding Configuration ---
+VIRTUAL_NODES = 64            # Points per shard on the hash ring, smooths out the IP distribution
+BATCH_WAIT_SECONDS = 0.05     # How long a worker waits to fill a micro-batch before flushing it
+BUSY_RETRIES = 3              # Attempts per event when the database is locked
+SUBMIT_TIMEOUT_SECONDS = 0.5  # How long log_receiver waits on a full shard queue before giving up
+SUPERVISE_INTERVAL = 1.0      # Seconds between worker liveness checks in run_shards
+
+_STOP = None  # Sentinel telling a worker to flush and exit
+
+
+class ShardUnavailable(Exception):
+    pass
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring mapping an IP address to the shard that owns it."""
+
+    def __init__(self, shard_count, virtual_nodes=VIRTUAL_NODES):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.shard_count = shard_count
+        points = sorted(
+            (_hash(f"shard-{shard}-{vnode}"), shard)
+            for shard in range(shard_count)
+            for vnode in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, ip_address):
+        index = bisect.bisect(self._keys, _hash(ip_address)) % len(self._keys)
+        return self._shards[index]
+
+
+def flush_batch(shard_id, batch):
+    """Writes a micro-batch in one transaction; if that fails, retries it one event per transaction.
+
+    Returns the number of events written. Only events that fail on their own are dropped.
+    """
+    from django.db import OperationalError, transaction
+    from .correlation import correlate_pending
+    from .services import analyze_log_entry
+
+    try:
+        # One transaction per micro-batch instead of one per row keeps the DB lock short and rare
+        with transaction.atomic():
+            pending = {}
+            for event in batch:
+                analyze_log_entry(event, pending)
+            correlate_pending(pending)
+        return len(batch)
+    except Exception as e:
+        logger.warning(f"Shard {shard_id} batch of {len(batch)} logs failed ({e}); retrying one by one")
+
+    written = 0
+    for event in batch:
+        for attempt in range(1, BUSY_RETRIES + 1):
+            try:
+                with transaction.atomic():
+                    analyze_log_entry(event)
+                written += 1
+                break
+            except OperationalError as e:
+                # Lock timeouts are transient, so only these are worth another attempt
+                if attempt == BUSY_RETRIES:
+                    logger.error(f"Shard {shard_id} dropped a log from {event.ip}: {e}")
+            except Exception as e:
+                logger.error(f"Shard {shard_id} dropped a log from {event.ip}: {e}")
+                break
+    return written
+
+
+def shard_worker(shard_id, inbox, ready, batch_size):
+    import django
+    django.setup()
+    from django.db import connection
+    ready.put(shard_id)
+
+    parent = multiprocessing.parent_process()
+    running = True
+    while running:
+        try:
+            event = inbox.get(timeout=SUPERVISE_INTERVAL)
+        except queue.Empty:
+            # Don't outlive a pool process that was killed without stopping its workers
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        if event is _STOP:
+            break
+        batch = [event]
+        while len(batch) < batch_size:
+            try:
+                event = inbox.get(timeout=BATCH_WAIT_SECONDS)
+            except queue.Empty:
+                break
+            if event is _STOP:
+                running = False
+                break
+            batch.append(event)
+        flush_batch(shard_id, batch)
+    connection.close()
+
+
+class ShardedAnalyzer:
+    """Runs analyze_log_entry in N worker processes, each owning a consistent-hash range of IPs.
+
+    Only one pool may run per database host; front ends reach it through ShardClient.
+    """
+
+    def __init__(self, shard_count, batch_size=None, queue_size=None):
+        self.ring = HashRing(shard_count)
+        self.batch_size = batch_size or settings.ANALYZER_SHARD_BATCH_SIZE
+        self.queue_size = queue_size or settings.ANALYZER_SHARD_QUEUE_SIZE
+        self._context = multiprocessing.get_context('spawn')
+        self._ready = self._context.Queue()
+        self._lock = threading.Lock()
+        self._queues = []
+        self._workers = []
+
+    @property
+    def shard_count(self):
+        return self.ring.shard_count
+
+    def _start_worker(self, shard_id):
+        worker = self._context.Process(
+            target=shard_worker,
+            args=(shard_id, self._queues[shard_id], self._ready, self.batch_size),
+            name=f"analyzer-shard-{shard_id}",
+            daemon=True,
+        )
+        worker.start()
+        self._workers[shard_id] = worker
+
+    def start(self):
+        self._queues = [self._context.Queue(maxsize=self.queue_size) for _ in range(self.shard_count)]
+        self._workers = [None] * self.shard_count
+        for shard_id in range(self.shard_count):
+            self._start_worker(shard_id)
+        return self
+
+    def wait_ready(self, timeout=None):
+        """Blocks until every worker has finished Django setup."""
+        for _ in self._workers:
+            self._ready.get(timeout=timeout)
+        return self
+
+    def check_workers(self):
+        """Restarts dead workers; their queues, and the events waiting in them, survive. Returns the restarted shard ids."""
+        restarted = []
+        with self._lock:
+            for shard_id, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    logger.error(f"Shard {shard_id} worker died (exit code {worker.exitcode}); restarting it")
+                    self._start_worker(shard_id)
+                    restarted.append(shard_id)
+        return restarted
+
+    def submit(self, event, timeout=SUBMIT_TIMEOUT_SECONDS):
+        shard_id = self.ring.shard_for(event.ip)
+        if not self._workers[shard_id].is_alive():
+            self.check_workers()
+        try:
+            self._queues[shard_id].put(event, timeout=timeout)
+        except queue.Full:
+            raise ShardUnavailable(f"Shard {shard_id} queue is full")
+
+    def stop(self, timeout=None):
+        for inbox in self._queues:
+            inbox.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+        self._queues = []
+        self._workers = []
+
+
+# --- Host-wide pool over a Unix socket ---
+class _ShardServer(BaseManager):
+    pass
+
+
+class _ShardClientManager(BaseManager):
+    pass
+
+
+_ShardClientManager.register('analyzer')
+
+
+def _authkey():
+    return settings.SECRET_KEY.encode('utf-8')
+
+
+def serve_forever(analyzer, address):
+    """Serves `analyzer.submit` on `address` while restarting dead workers; used by `manage.py run_shards`."""
+    _ShardServer.register('analyzer', callable=lambda: analyzer, exposed=('submit',))
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)  # Left behind by a previous pool that didn't shut down cleanly
+
+    def supervise():
+        while True:
+            analyzer.check_workers()
+            time.sleep(SUPERVISE_INTERVAL)
+
+    threading.Thread(target=supervise, name='analyzer-shard-supervisor', daemon=True).start()
+    _ShardServer(address=address, authkey=_authkey()).get_server().serve_forever()
+
+
+class ShardClient:
+    """Front-end handle on the host's shard pool; reconnects after the pool restarts."""
+
+    def __init__(self, address):
+        self.address = address
+        self._remote = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self._remote is None:
+                manager = _ShardClientManager(address=self.address, authkey=_authkey())
+                manager.connect()
+                self._remote = manager.analyzer()
+            return self._remote
+
+    def submit(self, event):
+        try:
+            self._connect().submit(event)
+        except ShardUnavailable:
+            raise
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            self._remote = None
+            raise ShardUnavailable(f"Shard pool at {self.address} is unreachable: {e}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sharded_analyzer():
+    """Returns this process's client for the host-wide shard pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ShardClient(settings.ANALYZER_SHARD_SOCKET)
+        return _client
@@ -1,3 +1,579 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import queue
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+
+from benchmarks.datasets import generate_events, persona_events
+from . import correlation
+from .codec import DECODERS, InvalidLogEvent, LogEvent, decode_event
+from .correlation import MAX_UA_HASHES, MIN_REQUESTS, band_keys, correlate, update_fingerprint
+from .models import ThreatSource, Anomaly, LogEntry, PurgeJob, SourceFingerprint
+from .purge import PURGE_STALE_SECONDS, run_purge_job
+from .services import analyze_log_entry, luhn_checksum
+from .sharding import HashRing, ShardClient, ShardedAnalyzer, ShardUnavailable, flush_batch
+from .views import dashboard_data
+
+
+NO_XSS = mock.Mock(**{'search.return_value': None})  # XSS_PATTERNS ends in an empty alternative and matches everything
+
+
+class FakeClock:
+    """Stands in for timezone.now() so time deltas (and the Robotic Activity rule) are deterministic."""
+
+    def __init__(self):
+        self.now = timezone.now()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def replay(events, ip, clock):
+    with mock.patch('django.utils.timezone.now', clock):
+        for log_data, delay in events:
+            analyze_log_entry(dict(log_data, ip=ip, country='XX'))
+            clock.advance(delay)
+    return ThreatSource.objects.get(ip_address=ip)
+
+
+class LuhnChecksumTests(TestCase):
+    def test_valid_numbers(self):
+        self.assertTrue(luhn_checksum('49927398716'))
+        self.assertTrue(luhn_checksum('4111111111111111'))
+
+    def test_invalid_numbers(self):
+        self.assertFalse(luhn_checksum('4111111111111112'))
+        self.assertFalse(luhn_checksum('5555444433332221'))
+
+    def test_non_numeric_input(self):
+        self.assertFalse(luhn_checksum('user=admin&pass=12345'))
+        self.assertFalse(luhn_checksum(None))
+
+
+class PersonaOutcomeTests(TestCase):
+    """Pins the score, status and anomalies each log_sender persona ends up with after two rounds of its actions."""
+
+    ips = {'normal': '10.0.0.1', 'scanner': '10.0.0.2', 'brute-force': '10.0.0.3', 'carder': '10.0.0.4'}
+
+    def assertOutcome(self, persona, score, status, logs, anomalies):
+        threat = replay(persona_events(persona, rounds=2), self.ips[persona], FakeClock())
+        self.assertEqual(threat.threat_score, score)
+        self.assertEqual(threat.status, status)
+        self.assertEqual(LogEntry.objects.filter(threat_source=threat).count(), logs)
+        self.assertEqual(list(Anomaly.objects.filter(threat_source=threat).order_by('id').values_list('reason', 'score_added')), anomalies)
+
+    def test_normal(self):
+        self.assertOutcome('normal', 120, 'blocked', 8, [('XSS Attempt', 60), ('XSS Attempt', 60)])
+
+    def test_scanner(self):
+        self.assertOutcome('scanner', 150, 'blocked', 12, [('Malicious Scanner UA', 40), ('Path Scanning', 50), ('XSS Attempt', 60)])
+
+    def test_brute_force(self):
+        self.assertOutcome('brute-force', 100, 'blocked', 8, [('Path Scanning', 25), ('XSS Attempt', 60), ('Login Brute-force', 15)])
+
+    def test_carder(self):
+        self.assertOutcome('carder', 150, 'blocked', 8, [('XSS Attempt', 60), ('XSS Attempt', 60), ('Invalid Card Number', 30)])
+
+    def test_robotic_activity(self):
+        clock = FakeClock()
+        events = [({'url': '/', 'status_code': 200, 'post_data': '', 'user_agent': 'curl'}, 0.05)] * 2
+        threat = replay(events, '10.0.1.1', clock)
+        self.assertIn(('Robotic Activity', 25), Anomaly.objects.filter(threat_source=threat).values_list('reason', 'score_added'))
+
+
+@override_settings(ANALYZER_CORRELATION=True, ANALYZER_SHARDS=0)
+class HotPathQueryTests(TestCase):
+    """Guards the number of SQL queries per ingested event."""
+
+    log_data = {'ip': '10.0.2.1', 'url': '/', 'status_code': 200, 'user_agent': 'curl'}
+
+    def test_first_event_for_new_source(self):
+        with self.assertNumQueries(12):
+            analyze_log_entry(self.log_data)
+
+    @mock.patch('analyzer.services.XSS_PATTERNS', NO_XSS)
+    def test_event_for_unclustered_source(self):
+        clock = FakeClock()
+        with mock.patch('django.utils.timezone.now', clock):
+            for _ in range(MIN_REQUESTS):
+                analyze_log_entry(self.log_data)
+                clock.advance(1)
+            # Steady state: no re-bucketing, and a cluster of one is never scored
+            with self.assertNumQueries(5):
+                analyze_log_entry(self.log_data)
+
+    def test_event_for_blocked_source(self):
+        ThreatSource.objects.create(ip_address='10.0.2.1', status='blocked', threat_score=100)
+        with self.assertNumQueries(3):
+            analyze_log_entry(self.log_data)
+
+
+class DecodeEventTests(TestCase):
+    def test_every_backend(self):
+        for name, loads in DECODERS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(decode_event(b'{"ip": "10.0.3.9", "status_code": 404}', loads).status_code, 404)
+                for body in (b'{"ip": ', b'\xff\xfe', b'', b'[1, 2]'):
+                    with self.assertRaises(InvalidLogEvent):
+                        decode_event(body, loads)
+
+
+@override_settings(ANALYZER_CORRELATION=True, ANALYZER_SHARDS=0)
+class LogReceiverTests(TestCase):
+    def post(self, body):
+        return self.client.post('/api/logs/', body, content_type='application/json')
+
+    def test_invalid_status_code_is_rejected(self):
+        response = self.post('{"ip": "10.0.3.1", "status_code": "abc"}')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_fields_are_truncated_to_model_limits(self):
+        response = self.post('{"ip": "10.0.3.2", "url": "/%s", "user_agent": "%s"}' % ('a' * 3000, 'b' * 300))
+        self.assertEqual(response.status_code, 200)
+        log = LogEntry.objects.get()
+        self.assertEqual(len(log.url), 2048)
+        self.assertEqual(len(log.user_agent), 255)
+
+    def test_anomaly_details_are_truncated_to_model_limit(self):
+        body = '{"ip": "10.0.3.3", "url": "/api/payment/transfer", "post_data": "%s"}' % ('9' * 4999 + '8')
+        self.assertEqual(self.post(body).status_code, 200)
+        details = Anomaly.objects.get(reason='Invalid Card Number').details
+        self.assertEqual(len(details), 255)
+        self.assertTrue(details.startswith('Failed Luhn check for: 999'))
+
+
+class ShardingTests(TestCase):
+    ips = [f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(10000)]
+
+    def event(self, ip):
+        return LogEvent(ip=ip, country='XX', url='/', status_code=200, post_data='', user_agent='curl')
+
+    def analyzer(self, shard_count, queue_size=100, alive=True):
+        analyzer = ShardedAnalyzer(shard_count, batch_size=10, queue_size=queue_size)
+        analyzer._queues = [queue.Queue(maxsize=queue_size) for _ in range(shard_count)]
+        analyzer._workers = [mock.Mock(**{'is_alive.return_value': alive}) for _ in range(shard_count)]
+        return analyzer
+
+    def test_hash_ring_spreads_ips_evenly(self):
+        ring = HashRing(4)
+        counts = [0] * 4
+        for ip in self.ips:
+            counts[ring.shard_for(ip)] += 1
+        for count in counts:
+            self.assertTrue(0.15 < count / len(self.ips) < 0.35, counts)
+
+    def test_adding_a_shard_only_moves_ips_to_it(self):
+        before, after = HashRing(4), HashRing(5)
+        moved = [ip for ip in self.ips if before.shard_for(ip) != after.shard_for(ip)]
+        self.assertLess(len(moved) / len(self.ips), 0.3)
+        self.assertEqual({after.shard_for(ip) for ip in moved}, {4})
+
+    def test_submit_routes_each_ip_to_its_owner(self):
+        analyzer = self.analyzer(3)
+        for ip in self.ips[:60]:
+            analyzer.submit(self.event(ip))
+        for shard_id, inbox in enumerate(analyzer._queues):
+            while not inbox.empty():
+                self.assertEqual(analyzer.ring.shard_for(inbox.get().ip), shard_id)
+
+    def test_full_queue_raises_shard_unavailable(self):
+        analyzer = self.analyzer(1, queue_size=1)
+        analyzer.submit(self.event('10.0.5.1'), timeout=0)
+        with self.assertRaises(ShardUnavailable):
+            analyzer.submit(self.event('10.0.5.1'), timeout=0)
+
+    def test_dead_worker_is_restarted_on_submit(self):
+        analyzer = self.analyzer(2, alive=False)
+        with mock.patch.object(analyzer, '_start_worker') as start_worker:
+            analyzer.submit(self.event('10.0.5.1'))
+        self.assertEqual(sorted(call.args[0] for call in start_worker.call_args_list), [0, 1])
+
+    def test_bad_event_does_not_drop_its_batch(self):
+        original = analyze_log_entry
+
+        def analyze(event, pending=None):
+            if event.ip == '10.0.5.9':
+                raise ValueError("bad event")
+            original(event, pending)
+
+        batch = [self.event(ip) for ip in ('10.0.5.1', '10.0.5.9', '10.0.5.2', '10.0.5.3')]
+        with mock.patch('analyzer.services.analyze_log_entry', analyze):
+            self.assertEqual(flush_batch(0, batch), 3)
+        self.assertEqual(sorted(LogEntry.objects.values_list('ip_address', flat=True)), ['10.0.5.1', '10.0.5.2', '10.0.5.3'])
+
+    def test_batched_events_are_timed_from_when_they_were_received(self):
+        received = timezone.now() - timedelta(seconds=30)
+        batch = [self.event('10.0.5.1'), self.event('10.0.5.1')]
+        batch[0].received_at, batch[1].received_at = received, received + timedelta(seconds=1)
+        self.assertEqual(flush_batch(0, batch), 2)
+        logs = list(LogEntry.objects.order_by('id').values_list('timestamp', 'time_delta_ms'))
+        self.assertEqual(logs, [(received, None), (received + timedelta(seconds=1), 1000)])
+        self.assertEqual(ThreatSource.objects.get().last_seen, received + timedelta(seconds=1))
+        self.assertFalse(Anomaly.objects.filter(reason='Robotic Activity').exists())
+
+    def test_unreachable_pool_raises_shard_unavailable(self):
+        with self.assertRaises(ShardUnavailable):
+            ShardClient('/nonexistent/analyzer-shards.sock').submit(self.event('10.0.5.1'))
+
+    @override_settings(ANALYZER_SHARDS=2)
+    def test_log_receiver_answers_503_when_shards_are_unavailable(self):
+        client = mock.Mock(**{'submit.side_effect': ShardUnavailable("Shard 0 queue is full")})
+        with mock.patch('analyzer.ingest.get_sharded_analyzer', return_value=client):
+            response = self.client.post('/api/logs/', '{"ip": "10.0.5.1"}', content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNotNone(client.submit.call_args.args[0].received_at)
+
+
+@override_settings(ANALYZER_CORRELATION=True, ANALYZER_SHARDS=0)
+class DashboardDataTests(TestCase):
+    def test_dashboard_data_after_replay(self):
+        clock = FakeClock()
+        for index, persona in enumerate(('normal', 'scanner', 'brute-force', 'carder')):
+            replay(persona_events(persona), f'10.0.4.{index}', clock)
+
+        request = RequestFactory().get('/api/dashboard-data/')
+        request.user = SimpleNamespace(is_authenticated=True)
+        with mock.patch('django.utils.timezone.now', clock), self.assertNumQueries(11):
+            data = json.loads(dashboard_data(request).content)
+        self.assertEqual(data['kpis']['total_requests'], 18)
+        self.assertEqual(data['kpis']['blocked_ips_count'], 4)
+        self.assertEqual(sorted(row['ip_address'] for row in data['modal_data']['blocked_ips']), [f'10.0.4.{index}' for index in range(4)])
+
+
+class TimelineTests(TestCase):
+    ip = '10.0.6.1'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('analyst'))
+        self.threat = ThreatSource.objects.create(ip_address=self.ip, country='XX', threat_score=60)
+        for index in range(12):
+            LogEntry.objects.create(threat_source=self.threat, ip_address=self.ip, url=f'/api/accounts/{index}', status_code=200, user_agent='curl')
+            Anomaly.objects.create(threat_source=self.threat, reason='Path Scanning', score_added=5, attacked_url='/', details='', log_entry='')
+        # Three timestamps shared by both tables, so every page boundary lands on a tie
+        base = timezone.now()
+        for model in (LogEntry, Anomaly):
+            for row_id in model.objects.values_list('id', flat=True):
+                model.objects.filter(id=row_id).update(timestamp=base - timedelta(minutes=row_id % 3))
+
+    def get(self, **params):
+        return self.client.get(f'/api/sources/{self.ip}/timeline/', params)
+
+    def test_pages_cover_ties_without_duplicates_or_gaps(self):
+        seen, cursor = [], None
+        while True:
+            data = self.get(limit=5, **({'cursor': cursor} if cursor else {})).json()
+            seen += [(event['type'], event['id']) for event in data['events']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = sorted(
+            [(log.timestamp, 0, log.id, 'log') for log in LogEntry.objects.all()]
+            + [(anomaly.timestamp, 1, anomaly.id, 'anomaly') for anomaly in Anomaly.objects.all()],
+            reverse=True,
+        )
+        self.assertEqual(seen, [(kind, pk) for _, _, pk, kind in expected])
+
+    def test_invalid_cursors_are_rejected(self):
+        naive = base64.urlsafe_b64encode(b'2024-01-01T00:00:00|0|5').decode('ascii')
+        for cursor in ('not-a-cursor', naive):
+            response = self.get(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_unknown_ip_is_404(self):
+        self.assertEqual(self.client.get('/api/sources/10.9.9.9/timeline/').status_code, 404)
+
+    def test_summary(self):
+        summary = self.get(summary=1).json()['summary']
+        self.assertEqual(summary['reasons'], [{'reason': 'Path Scanning', 'count': 12, 'score_added': 60}])
+        self.assertEqual(summary['url_templates'], [{'template': '/api/accounts/{id}', 'count': 12}])
+        self.assertEqual(summary['url_templates_sampled_logs'], 12)
+        self.assertEqual(summary['score_history'][-1]['cumulative'], 60)
+        self.assertNotIn('summary', self.get().json())
+
+    def test_score_history_window_carries_older_score(self):
+        Anomaly.objects.create(threat_source=self.threat, reason='XSS Attempt', score_added=40, attacked_url='/', details='', log_entry='',
+                               timestamp=timezone.now() - timedelta(days=3))
+        history = self.get(summary=1).json()['summary']['score_history']
+        self.assertEqual(history[0]['cumulative'] - history[0]['score_added'], 40)
+        self.assertEqual(history[-1]['cumulative'], 100)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('analyst'))
+        blocked = ThreatSource.objects.create(ip_address='10.0.7.1', country='DE', status='blocked', threat_score=120)
+        active = ThreatSource.objects.create(ip_address='10.0.7.2', status='active', threat_score=0)
+        for status_code in (200, 404, 401):
+            LogEntry.objects.create(threat_source=blocked, ip_address='10.0.7.1', country='DE', url='/login', status_code=status_code, user_agent='curl', time_delta_ms=40)
+        LogEntry.objects.create(threat_source=active, ip_address='10.0.7.2', url='/', status_code=200, user_agent='curl')
+        Anomaly.objects.create(threat_source=blocked, reason='Login Brute-force', score_added=15, attacked_url='/login', details='Failed login attempt', log_entry='')
+        Anomaly.objects.create(threat_source=blocked, reason='Path Scanning', score_added=25, attacked_url='/login', details='a=b|c', log_entry='')
+
+    def export(self, kind, **params):
+        response = self.client.get(f'/api/export/{kind}/', params)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def rows(self, kind, **params):
+        return [json.loads(line) for line in self.export(kind, **params)[1].decode().splitlines()]
+
+    def test_ndjson_logs(self):
+        rows = self.rows('logs')
+        self.assertEqual([row['status_code'] for row in rows], [200, 404, 401, 200])
+        self.assertEqual(rows[0]['ip_address'], '10.0.7.1')
+
+    def test_filters(self):
+        self.assertEqual([row['status_code'] for row in self.rows('logs', status_code=404)], [404])
+        self.assertEqual([row['ip_address'] for row in self.rows('logs', status='active')], ['10.0.7.2'])
+        self.assertEqual(len(self.rows('logs', country='DE')), 3)
+        self.assertEqual([row['reason'] for row in self.rows('anomalies', reason='Path Scanning')], ['Path Scanning'])
+        self.assertEqual(self.rows('logs', since=(timezone.now() + timedelta(hours=1)).isoformat()), [])
+
+    def test_invalid_filters_are_400(self):
+        for kind, params in (('logs', {'reason': 'XSS Attempt'}), ('anomalies', {'status_code': '200'}),
+                             ('logs', {'since': 'yesterday'}), ('logs', {'since': '2024-13-45T00:00:00'}),
+                             ('logs', {'format': 'xml'}), ('users', {})):
+            self.assertEqual(self.export(kind, **params)[0].status_code, 400, (kind, params))
+
+    def test_after_resumes_an_interrupted_export(self):
+        first, *rest = self.rows('logs')
+        self.assertEqual(self.rows('logs', after=first['id']), rest)
+
+    def test_gzip_csv(self):
+        response, body = self.export('anomalies', format='csv', gzip=1)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="anomalies.csv.gz"')
+        lines = gzip.decompress(body).decode().splitlines()
+        self.assertEqual(lines[0], 'id,timestamp,ip_address,country,reason,score_added,attacked_url,details')
+        self.assertEqual(len(lines), 3)
+
+    def test_cef(self):
+        lines = self.export('logs', format='cef')[1].decode().splitlines()
+        log = LogEntry.objects.order_by('id').first()
+        self.assertIn(f"rt={int(log.timestamp.timestamp() * 1000)} ", lines[0])
+        self.assertIn('cs1Label=country cs1=DE', lines[0])
+        self.assertIn('cn1Label=timeDeltaMs cn1=40', lines[0])
+        # No country and no time delta: neither value nor its label is emitted
+        self.assertNotIn('cs1', lines[3])
+        self.assertNotIn('cn1', lines[3])
+        anomaly = self.export('anomalies', format='cef', reason='Path Scanning')[1].decode()
+        self.assertIn('|Path Scanning|Path Scanning|2|', anomaly)
+        self.assertIn('msg=a\\=b|c', anomaly)
+
+    def test_export_data_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logs.ndjson.gz')
+            call_command('export_data', 'logs', '--gzip', '--status-code', '200', '--output', path)
+            with gzip.open(path, 'rt') as output:
+                rows = [json.loads(line) for line in output]
+        self.assertEqual([row['ip_address'] for row in rows], ['10.0.7.1', '10.0.7.2'])
+
+    def test_export_data_command_rejects_bad_filters(self):
+        with self.assertRaisesMessage(CommandError, "'until' must be an ISO 8601 datetime"):
+            call_command('export_data', 'logs', '--until', '2024-02-30T00:00:00', stdout=io.StringIO())
+
+
+@mock.patch('analyzer.purge.threading.Thread')
+class PurgeTests(TestCase):
+    """Jobs are started with the background thread mocked out and run inline with run_purge_job."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('analyst'))
+        self.old = timezone.now() - timedelta(days=2)
+        for ip in ('10.0.8.1', '10.0.8.2'):
+            threat = ThreatSource.objects.create(ip_address=ip, threat_score=40)
+            for _ in range(3):
+                LogEntry.objects.create(threat_source=threat, ip_address=ip, url='/', status_code=200, user_agent='curl')
+                Anomaly.objects.create(threat_source=threat, reason='Path Scanning', score_added=5, attacked_url='/', details='', log_entry='')
+        LogEntry.objects.filter(id__in=LogEntry.objects.order_by('id').values('id')[:2]).update(timestamp=self.old)
+
+    def purge(self, body):
+        return self.client.post('/api/purge/', body, content_type='application/json')
+
+    def run_job(self, body):
+        response = self.purge(body)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(run_purge_job(response.json()['job_id']))
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_reset(self, thread):
+        status = self.run_job({'kind': 'reset'})
+        self.assertEqual((status['status'], status['deleted_rows'], status['progress']), ('done', 14, 1.0))
+        self.assertFalse(ThreatSource.objects.exists() or LogEntry.objects.exists() or Anomaly.objects.exists())
+        thread.return_value.start.assert_called_once()
+
+    def test_ip(self, thread):
+        status = self.run_job({'kind': 'ip', 'ip_address': '10.0.8.1'})
+        self.assertEqual((status['status'], status['deleted_rows']), ('done', 7))
+        self.assertEqual(list(ThreatSource.objects.values_list('ip_address', flat=True)), ['10.0.8.2'])
+        self.assertEqual(set(LogEntry.objects.values_list('ip_address', flat=True)), {'10.0.8.2'})
+
+    def test_range(self, thread):
+        status = self.run_job({'kind': 'range', 'until': (self.old + timedelta(hours=1)).isoformat()})
+        self.assertEqual((status['status'], status['deleted_rows']), ('done', 2))
+        self.assertEqual(LogEntry.objects.count(), 4)
+        self.assertEqual(ThreatSource.objects.count(), 2)
+
+    def test_invalid_requests(self, thread):
+        for body in ('[]', '"reset"', '{"kind": "wipe"}', '{"kind": "ip"}', '{"kind": "ip", "ip_address": 5}',
+                     '{"kind": "range"}', '{"kind": "range", "since": "yesterday"}', '{"kind": "range", "until": 5}', 'nope'):
+            self.assertEqual(self.purge(body).status_code, 400, body)
+        self.assertEqual(self.client.get('/api/purge/').status_code, 405)
+        self.assertEqual(self.client.get('/api/purge/999/').status_code, 404)
+        self.assertFalse(PurgeJob.objects.exists())
+
+    def test_reset_all_data(self, thread):
+        response = self.client.post('/api/reset-all-data/')
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+        job = PurgeJob.objects.get()
+        self.assertEqual((job.kind, job.status), ('reset', 'pending'))
+        self.assertEqual(self.client.get('/api/purge/%d/' % job.id).json()['progress'], 0.0)
+
+    def test_orphaned_job_is_resumed(self, thread):
+        stale = timezone.now() - timedelta(seconds=PURGE_STALE_SECONDS + 1)
+        # Its worker died after deleting 5 rows of a reset
+        orphan = PurgeJob.objects.create(kind='reset', status='running', total_rows=19, deleted_rows=5, heartbeat_at=stale)
+        live = PurgeJob.objects.create(kind='reset', status='running', heartbeat_at=timezone.now())
+        self.assertFalse(run_purge_job(live.id))
+
+        call_command('run_purge_jobs', '--once', stdout=io.StringIO())
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.status, orphan.deleted_rows, orphan.total_rows), ('done', 19, 19))
+        self.assertEqual(PurgeJob.objects.get(id=live.id).status, 'running')
+
+    def test_progress_never_exceeds_one(self, thread):
+        job = PurgeJob.objects.create(kind='reset', status='running', total_rows=10, deleted_rows=12)
+        self.assertEqual(self.client.get('/api/purge/%d/' % job.id).json()['progress'], 1.0)
+
+
+class CorrelationTests(TestCase):
+    urls = ['/api/accounts/1', '/api/accounts/2/transfers', '/api/cards', '/login', '/static/app.js', '/api/profile']
+
+    def event(self, url, user_agent='python-requests/2.31', status_code=200):
+        return LogEvent(ip='', country='XX', url=url, status_code=status_code, post_data='', user_agent=user_agent)
+
+    def events(self, urls=None):
+        return [(self.event(url), 1000) for url in urls or self.urls]
+
+    def source(self, ip, score=0, urls=None):
+        threat = ThreatSource.objects.create(ip_address=ip, threat_score=score)
+        correlate(threat, self.events(urls))
+        return threat
+
+    def fingerprint(self, threat):
+        return SourceFingerprint.objects.get(threat_source=threat)
+
+    def test_update_fingerprint(self):
+        fingerprint = SourceFingerprint(minhash=[], ua_hashes=[], status_mix={}, timing_histogram={})
+        update_fingerprint(fingerprint, self.event('/a/1', 'Curl'), None)
+        update_fingerprint(fingerprint, self.event('/a/2', 'curl', 404), 1000)
+        for index in range(MAX_UA_HASHES + 2):
+            update_fingerprint(fingerprint, self.event('/b', f'agent-{index}'), 1000)
+        self.assertEqual(fingerprint.request_count, MAX_UA_HASHES + 4)
+        self.assertEqual(len(fingerprint.ua_hashes), MAX_UA_HASHES)
+        self.assertEqual(fingerprint.status_mix, {'2xx': MAX_UA_HASHES + 3, '4xx': 1})
+        self.assertEqual(fingerprint.timing_histogram, {'9': MAX_UA_HASHES + 3})
+
+        # MinHash is over URL templates and doesn't depend on the order they were seen in
+        reordered = SourceFingerprint(minhash=[], ua_hashes=[], status_mix={}, timing_histogram={})
+        for url in ('/b', '/a/7'):
+            update_fingerprint(reordered, self.event(url), None)
+        self.assertEqual(reordered.minhash, fingerprint.minhash)
+
+    def test_lsh_only_clusters_sources_sharing_a_band(self):
+        first, twin = self.source('10.0.9.1'), self.source('10.0.9.2')
+        stranger = self.source('10.0.9.3', urls=[f'/other/{name}' for name in 'abcdef'])
+        self.assertEqual(band_keys(self.fingerprint(first)), band_keys(self.fingerprint(twin)))
+        self.assertFalse(set(band_keys(self.fingerprint(first))) & set(band_keys(self.fingerprint(stranger))))
+        self.assertEqual(self.fingerprint(twin).cluster_id, self.fingerprint(first).id)
+        self.assertTrue(self.fingerprint(first).clustered)
+        self.assertEqual(self.fingerprint(stranger).cluster_id, self.fingerprint(stranger).id)
+        self.assertFalse(self.fingerprint(stranger).clustered)
+
+    def test_members_join_the_representative_not_a_chain(self):
+        scores = {('10.0.9.2', '10.0.9.1'): 0.9, ('10.0.9.3', '10.0.9.1'): 0.5, ('10.0.9.3', '10.0.9.2'): 0.9}
+
+        def fake_similarity(a, b):
+            return scores.get((a.threat_source.ip_address, b.threat_source.ip_address), 0)
+
+        with mock.patch.object(correlation, 'similarity', fake_similarity):
+            first, second, third = (self.source(f'10.0.9.{index}') for index in (1, 2, 3))
+        self.assertEqual(self.fingerprint(second).cluster_id, self.fingerprint(first).id)
+        # Similar to a member, but not to the cluster's representative
+        self.assertEqual(self.fingerprint(third).cluster_id, self.fingerprint(third).id)
+
+    def test_campaign_blocks_members_with_their_own_signal(self):
+        self.source('10.0.9.1', score=60)
+        self.source('10.0.9.2', score=60)
+        clean = self.source('10.0.9.3', score=0)
+        self.assertEqual(dict(ThreatSource.objects.values_list('ip_address', 'status')),
+                         {'10.0.9.1': 'blocked', '10.0.9.2': 'blocked', '10.0.9.3': 'active'})
+        self.assertEqual(Anomaly.objects.filter(reason='Campaign Correlation').count(), 2)
+        self.assertFalse(Anomaly.objects.filter(threat_source=clean).exists())
+
+    def test_large_cluster_of_ordinary_users_is_not_blocked(self):
+        for index in range(8):
+            self.source(f'10.0.9.{index}', score=30)
+        self.assertEqual(SourceFingerprint.objects.values('cluster_id').distinct().count(), 1)
+        self.assertFalse(ThreatSource.objects.filter(status='blocked').exists())
+
+    def test_fingerprint_created_by_a_concurrent_request_is_reused(self):
+        threat = ThreatSource.objects.create(ip_address='10.0.9.1')
+        existing = SourceFingerprint.objects.create(threat_source=threat, cluster_id=0)
+        original_get = QuerySet.get
+        missed = []
+
+        def get(queryset, *args, **kwargs):
+            # The first lookup runs before the other request's insert commits
+            if queryset.model is SourceFingerprint and not missed:
+                missed.append(True)
+                raise SourceFingerprint.DoesNotExist
+            return original_get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', get):
+            self.assertFalse(correlate(threat, self.events()[:1]))
+        self.assertEqual(list(SourceFingerprint.objects.values_list('id', 'request_count')), [(existing.id, 1)])
+
+    def test_unchanged_cluster_is_not_rescored(self):
+        members = [self.source(f'10.0.9.{index}', score=30) for index in range(3)]
+        with self.assertNumQueries(2):
+            correlate(members[1], self.events()[:1])
+
+    @override_settings(ANALYZER_CORRELATION=True)
+    def test_micro_batch_updates_each_fingerprint_once(self):
+        batch = [LogEvent(ip=ip, country='XX', url=url, status_code=200, post_data='', user_agent='curl')
+                 for url in self.urls for ip in ('10.0.9.1', '10.0.9.2')]
+        clock = FakeClock()
+        with mock.patch('analyzer.services.XSS_PATTERNS', NO_XSS), \
+                mock.patch('django.utils.timezone.now', lambda: clock.advance(1) or clock.now), \
+                mock.patch.object(correlation, 'correlate', wraps=correlation.correlate) as wrapped:
+            self.assertEqual(flush_batch(0, batch), len(batch))
+        self.assertEqual(wrapped.call_count, 2)
+        self.assertEqual(sorted(SourceFingerprint.objects.values_list('request_count', flat=True)), [6, 6])
+
+
+class DatasetTests(TestCase):
+    def test_generated_events_are_deterministic(self):
+        self.assertEqual(list(generate_events(50, seed=7)), list(generate_events(50, seed=7)))
+        self.assertNotEqual(list(generate_events(50, seed=7)), list(generate_events(50, seed=8)))
+
+    def test_sources_spread_events_over_many_ips(self):
+        events = list(generate_events(2000, seed=7, sources=500))
+        self.assertGreater(len({log_data['ip'] for log_data, _ in events}), 400)
+        self.assertEqual(events, list(generate_events(2000, seed=7, sources=500)))
@@ -0,0 +1,121 @@
+import base64
+import heapq
+import re
+from datetime import datetime, timedelta
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from .models import Anomaly, LogEntry
+
+# --- Timeline Configuration ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SUMMARY_LOG_LIMIT = 2000   # Most recent logs folded into URL templates, so busy IPs stay cheap to summarise
+SUMMARY_HISTORY_HOURS = 24  # Score history covers this long up to the source's latest anomaly
+
+# Logs sort before anomalies raised at the same instant (rank is part of the keyset)
+LOG_RANK = 0
+ANOMALY_RANK = 1
+
+LOG_FIELDS = ('id', 'timestamp', 'url', 'status_code', 'user_agent', 'time_delta_ms')
+ANOMALY_FIELDS = ('id', 'timestamp', 'reason', 'score_added', 'attacked_url', 'details')
+
+URL_ID_PATTERN = re.compile(r'/\d+(?=/|$)')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, rank, pk):
+    raw = f"{timestamp.isoformat()}|{rank}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, rank, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        timestamp, rank, pk = datetime.fromisoformat(timestamp), int(rank), int(pk)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+    # encode_cursor always writes an aware timestamp; anything else was not issued by us
+    if timezone.is_naive(timestamp) or rank not in (LOG_RANK, ANOMALY_RANK):
+        raise InvalidCursor("Invalid cursor")
+    return timestamp, rank, pk
+
+
+def _after(cursor, rank):
+    """Rows strictly after the cursor in (timestamp, rank, id) descending order."""
+    timestamp, cursor_rank, pk = cursor
+    if rank < cursor_rank:
+        return Q(timestamp__lte=timestamp)
+    if rank > cursor_rank:
+        return Q(timestamp__lt=timestamp)
+    # The redundant upper bound is what gives SQLite an index range; with only the OR it scans the
+    # source's rows from the newest one down to the cursor
+    return Q(timestamp__lte=timestamp) & (Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+
+def _page(queryset, fields, rank, cursor, limit):
+    if cursor:
+        queryset = queryset.filter(_after(cursor, rank))
+    # Served straight from the (ip/source, timestamp, id) indexes, no OFFSET scan
+    rows = queryset.order_by('-timestamp', '-id').values(*fields)[:limit + 1]
+    return [((row['timestamp'], rank, row['id']), row) for row in rows]
+
+
+def get_timeline_page(threat, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Returns one page of logs and anomalies for an IP, newest first, and the cursor for the next one."""
+    cursor = decode_cursor(cursor) if cursor else None
+    logs = _page(LogEntry.objects.filter(ip_address=threat.ip_address), LOG_FIELDS, LOG_RANK, cursor, limit)
+    anomalies = _page(Anomaly.objects.filter(threat_source=threat), ANOMALY_FIELDS, ANOMALY_RANK, cursor, limit)
+
+    merged = list(heapq.merge(logs, anomalies, key=lambda item: item[0], reverse=True))
+    page = merged[:limit]
+    events = []
+    for (timestamp, rank, _), row in page:
+        row['type'] = 'log' if rank == LOG_RANK else 'anomaly'
+        row['timestamp'] = timestamp.isoformat()
+        events.append(row)
+
+    next_cursor = encode_cursor(*page[-1][0]) if len(merged) > limit else None
+    return events, next_cursor
+
+
+def url_template(url):
+    path = url.split('?', 1)[0]
+    return URL_ID_PATTERN.sub('/{id}', path) or '/'
+
+
+def get_timeline_summary(threat):
+    anomalies = Anomaly.objects.filter(threat_source=threat)
+
+    reasons = list(anomalies.values('reason').annotate(count=Count('id'), score_added=Sum('score_added')).order_by('-count'))
+
+    # Only the most recent logs, read newest first off the (ip_address, timestamp, id) index
+    recent_urls = (LogEntry.objects.filter(ip_address=threat.ip_address)
+                   .order_by('-timestamp', '-id').values_list('url', flat=True)[:SUMMARY_LOG_LIMIT])
+    templates = {}
+    sampled = 0
+    for url in recent_urls:
+        template = url_template(url)
+        templates[template] = templates.get(template, 0) + 1
+        sampled += 1
+    url_templates = sorted(({'template': t, 'count': c} for t, c in templates.items()), key=lambda r: -r['count'])
+
+    # Per-minute buckets only for the recent window; everything older is carried in as the starting total,
+    # taken from the per-reason sums rather than another pass over the source's anomalies
+    score_history = []
+    latest = anomalies.order_by('-timestamp').values_list('timestamp', flat=True).first()
+    if latest is not None:
+        window_start = latest - timedelta(hours=SUMMARY_HISTORY_HOURS)
+        recent = list(anomalies.filter(timestamp__gte=window_start).annotate(minute=TruncMinute('timestamp'))
+                      .values('minute').annotate(score=Sum('score_added')).order_by('minute'))
+        total = sum(row['score_added'] for row in reasons) - sum(row['score'] for row in recent)
+        for row in recent:
+            total += row['score']
+            score_history.append({'minute': row['minute'].isoformat(), 'score_added': row['score'], 'cumulative': total})
+
+    return {'reasons': reasons, 'url_templates': url_templates, 'url_templates_sampled_logs': sampled, 'score_history': score_history}
@@ -6,7 +6,11 @@ urlpatterns = [
     path('api/logs/', views.log_receiver, name='log_receiver'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('api/dashboard-data/', views.dashboard_data, name='dashboard_data'),
+    path('api/sources/<str:ip_address>/timeline/', views.source_timeline, name='source_timeline'),
+    path('api/export/<str:kind>/', views.export_data, name='export_data'),
     path('api/kpi-insights/', views.generate_kpi_insights, name='generate_kpi_insights'),
     path('api/deep-analysis/', views.generate_deep_analysis, name='generate_deep_analysis'),
     path('api/reset-all-data/', views.reset_all_data, name='reset_all_data'),
+    path('api/purge/', views.purge_data, name='purge_data'),
+    path('api/purge/<int:job_id>/', views.purge_status, name='purge_status'),
 ]
@@ -1,32 +1,23 @@
 import json
 import os
 import logging
-import google.generativeai as genai
 from datetime import timedelta
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponseRedirect
+from django.utils.dateparse import parse_datetime
+from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse
-from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Sum, Avg
 from django.db.models.functions import TruncMinute
-from .models import ThreatSource, Anomaly, LogEntry, AIAnalysis
-from .services import analyze_log_entry
+from .models import ThreatSource, Anomaly, LogEntry, AIAnalysis, PurgeJob
+from .export import build_queryset, iter_export, InvalidExport, CONTENT_TYPES
+from .purge import start_purge_job
+from .timeline import get_timeline_page, get_timeline_summary, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .ingest import log_receiver
 
 logger = logging.getLogger(__name__)
 
-@csrf_exempt
-def log_receiver(request):
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            analyze_log_entry(data)
-            return JsonResponse({"status": "ok"})
-        except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid JSON"}, status=400)
-    return JsonResponse({"error": "Only POST method allowed"}, status=405)
-
 @login_required
 def dashboard(request):
     analyses = AIAnalysis.objects.all()
@@ -76,10 +67,54 @@ def dashboard_data(request):
 
     return JsonResponse({'kpis': kpis, 'charts': charts, 'modal_data': modal_data, 'live_logs': live_logs})
 
+@login_required
+def source_timeline(request, ip_address):
+    threat = ThreatSource.objects.filter(ip_address=ip_address).first()
+    if threat is None:
+        return JsonResponse({"error": "Unknown IP"}, status=404)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        events, next_cursor = get_timeline_page(threat, request.GET.get('cursor'), limit)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    data = {
+        'source': {'ip_address': threat.ip_address, 'country': threat.country, 'threat_score': threat.threat_score, 'status': threat.status},
+        'events': events,
+        'next_cursor': next_cursor,
+    }
+    if request.GET.get('summary') in ('1', 'true'):
+        data['summary'] = get_timeline_summary(threat)
+    return JsonResponse(data)
+
+@login_required
+def export_data(request, kind):
+    fmt = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip') in ('1', 'true')
+    filters = {key: request.GET.get(key) for key in ('since', 'until', 'reason', 'status', 'status_code', 'country', 'after')}
+    try:
+        queryset = build_queryset(kind, **filters)
+        chunks = iter_export(kind, queryset, fmt, compress)
+    except InvalidExport as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    filename = f"{kind}.{'csv' if fmt == 'csv' else 'log' if fmt == 'cef' else 'ndjson'}"
+    content_type = CONTENT_TYPES[fmt]
+    if compress:
+        filename, content_type = f"{filename}.gz", 'application/gzip'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 def get_gemini_model():
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key or api_key == 'YOUR_GEMINI_API_KEY':
         raise ValueError("GEMINI_API_KEY not configured on server or is set to default.")
+    # Imported on first use so processes that never call the AI (e.g. ingest workers) skip its startup cost
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     return genai.GenerativeModel('gemini-2.5-flash')
 
@@ -151,9 +186,56 @@ def generate_deep_analysis(request):
 @login_required
 def reset_all_data(request):
     if request.method == 'POST':
-        LogEntry.objects.all().delete()
-        Anomaly.objects.all().delete()
-        ThreatSource.objects.all().delete()
-        AIAnalysis.objects.all().delete()
-        return HttpResponseRedirect(reverse('analyzer:dashboard'))
-    return HttpResponseRedirect(reverse('analyzer:dashboard'))
\ No newline at end of file
+        # Runs as a chunked background purge so ingestion isn't locked out for the duration
+        start_purge_job('reset')
+    return HttpResponseRedirect(reverse('analyzer:dashboard'))
+
+@login_required
+def purge_data(request):
+    if request.method != 'POST':
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "JSON body must be an object"}, status=400)
+
+    kind = body.get('kind')
+    if kind == 'reset':
+        job = start_purge_job('reset')
+    elif kind == 'ip':
+        if not isinstance(body.get('ip_address'), str) or not body['ip_address']:
+            return JsonResponse({"error": "'ip_address' is required"}, status=400)
+        job = start_purge_job('ip', ip_address=body['ip_address'])
+    elif kind == 'range':
+        bounds = {}
+        for name in ('since', 'until'):
+            if body.get(name) is None:
+                continue
+            try:
+                value = parse_datetime(body[name])
+            except (TypeError, ValueError):
+                value = None
+            if value is None:
+                return JsonResponse({"error": f"'{name}' must be an ISO 8601 datetime"}, status=400)
+            bounds[name] = timezone.make_aware(value) if timezone.is_naive(value) else value
+        if not bounds:
+            return JsonResponse({"error": "'since' and/or 'until' must be ISO 8601 datetimes"}, status=400)
+        job = start_purge_job('range', **bounds)
+    else:
+        return JsonResponse({"error": "'kind' must be one of: reset, ip, range"}, status=400)
+    return JsonResponse({"job_id": job.id, "status_url": reverse('analyzer:purge_status', args=[job.id])}, status=202)
+
+@login_required
+def purge_status(request, job_id):
+    job = PurgeJob.objects.filter(id=job_id).values(
+        'id', 'kind', 'ip_address', 'since', 'until', 'status', 'total_rows', 'deleted_rows', 'error', 'created_at', 'finished_at'
+    ).first()
+    if job is None:
+        return JsonResponse({"error": "Unknown purge job"}, status=404)
+    if job['total_rows']:
+        job['progress'] = min(1.0, job['deleted_rows'] / job['total_rows'])
+    else:
+        job['progress'] = 1.0 if job['status'] == 'done' else 0.0
+    return JsonResponse(job)
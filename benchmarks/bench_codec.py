@@ -0,0 +1,80 @@
+"""
+Compares log ingestion parsing paths on NDJSON batches built from the log_sender personas.
+
+"baseline" is what log_receiver used to do per event: json.loads, the dict lookups and a
+json.dumps for every anomaly. The other rows decode, validate and serialise once through
+analyzer.codec with each installed decoder.
+
+    python benchmarks/bench_codec.py --events 10000 --rounds 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fixit_project.settings')
+
+ANOMALIES_PER_EVENT = 2  # Rough average of rules fired per malicious event
+
+
+def build_ndjson(count, seed):
+    import log_sender
+    random.seed(seed)
+    return b'\n'.join(json.dumps(log_sender.generate_log_line()).encode('utf-8') for _ in range(count))
+
+
+def parse_baseline(body):
+    for line in body.splitlines():
+        log_data = json.loads(line)
+        log_data.get('ip')
+        log_data.get('url', '')
+        int(log_data.get('status_code', 200))
+        log_data.get('user_agent', '')
+        log_data.get('post_data', '')
+        for _ in range(ANOMALIES_PER_EVENT):
+            json.dumps(log_data)
+
+
+def parse_codec(body, loads):
+    from analyzer.codec import decode_batch
+    for event in decode_batch(body, loads):
+        for _ in range(ANOMALIES_PER_EVENT):
+            event.line
+
+
+def best_of(rounds, func, *args):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from analyzer.codec import DECODERS
+
+    body = build_ndjson(args.events, args.seed)
+    print(f"{args.events} events, {len(body) / 1024:.0f} KiB of NDJSON, best of {args.rounds}")
+    print(f"{'path':>10}  {'events/sec':>12}  {'ms/batch':>9}")
+    paths = [('baseline', parse_baseline, ())] + [(name, parse_codec, (loads,)) for name, loads in DECODERS.items()]
+    for name, func, extra in paths:
+        elapsed = best_of(args.rounds, func, body, *extra)
+        print(f"{name:>10}  {args.events / elapsed:>12.0f}  {elapsed * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
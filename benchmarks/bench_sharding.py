@@ -0,0 +1,82 @@
+"""
+Measures ingest throughput (events/sec) of the sharded analyzer for 1, 2, 4 and 8 shards.
+
+Runs against a throwaway SQLite database in a temp directory, so the project database is never touched.
+Events come from benchmarks.datasets spread over --sources distinct IPs, and each is stamped with the
+time log_sender's delays say it arrived, so the analysis rules see realistic request timing.
+
+    python benchmarks/bench_sharding.py --events 20000 --sources 5000 --shards 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fixit_project.settings')
+
+
+def build_events(count, seed, sources):
+    from django.utils import timezone
+    from analyzer.codec import LogEvent
+    from benchmarks.datasets import generate_events
+
+    events = []
+    received_at = timezone.now()
+    for log_data, delay in generate_events(count, seed, sources=sources):
+        event = LogEvent.from_dict(log_data)
+        event.received_at = received_at
+        received_at += timedelta(seconds=delay)
+        events.append(event)
+    return events
+
+
+def run(shard_count, events, batch_size):
+    from django.core.management import call_command
+    from django.db import connections
+    from analyzer.sharding import ShardedAnalyzer
+
+    call_command('flush', interactive=False, verbosity=0)
+    connections.close_all()
+
+    analyzer = ShardedAnalyzer(shard_count, batch_size=batch_size).start().wait_ready()
+    started = time.perf_counter()
+    for log_data in events:
+        analyzer.submit(log_data, timeout=None)
+    analyzer.stop()
+    return len(events) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--sources', type=int, default=5000, help="Distinct source IPs the events are spread over")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shard workers are spawned, so they pick the database path up from the environment
+        os.environ['SQLITE_PATH'] = os.path.join(tmp, 'bench.sqlite3')
+
+        import django
+        from django.core.management import call_command
+        django.setup()
+        call_command('migrate', verbosity=0)
+
+        events = build_events(args.events, args.seed, args.sources)
+        print(f"{'shards':>6}  {'events/sec':>12}  {'speedup':>8}")
+        baseline = None
+        for shard_count in args.shards:
+            rate = run(shard_count, events, args.batch_size)
+            baseline = baseline or rate
+            print(f"{shard_count:>6}  {rate:>12.0f}  {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares the full site and the ingest-only profile on cold start and per-request overhead.
+
+Cold start is measured in a fresh interpreter per run: Django setup, building the WSGI
+handler (middleware chain) and serving the first request to /api/logs/. Per-request overhead
+is the mean time to answer GET /api/logs/ (a 405 that never touches the database), so it is
+mostly URL resolution and middleware.
+
+    python benchmarks/bench_startup.py --runs 5 --requests 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    'full': 'fixit_project.settings',
+    'ingest': 'fixit_project.ingest_settings',
+}
+
+
+def measure(request_count):
+    """Runs inside the child interpreter and prints one JSON line of results."""
+    started = time.perf_counter()
+    import django
+    django.setup()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    setup_test_environment()  # Allows the test client's 'testserver' host
+    WSGIHandler()
+    client = Client()
+    client.get('/api/logs/')
+    cold_start = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(request_count):
+        client.get('/api/logs/')
+    per_request = (time.perf_counter() - started) / request_count
+
+    print(json.dumps({
+        'cold_start_ms': cold_start * 1000,
+        'per_request_us': per_request * 1_000_000,
+        'genai_loaded': 'google.generativeai' in sys.modules,
+        'modules': len(sys.modules),
+    }))
+
+
+def run_child(settings_module, request_count):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    result = subprocess.run(
+        [sys.executable, __file__, '--_child', str(request_count)],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8}  {'cold start ms':>14}  {'us/request':>11}  {'modules':>8}  {'genai loaded':>12}")
+    for name, settings_module in PROFILES.items():
+        results = [run_child(settings_module, args.requests) for _ in range(args.runs)]
+        cold_start = statistics.median(r['cold_start_ms'] for r in results)
+        per_request = statistics.median(r['per_request_us'] for r in results)
+        print(f"{name:>8}  {cold_start:>14.1f}  {per_request:>11.1f}  {results[0]['modules']:>8}  {str(results[0]['genai_loaded']):>12}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--_child':
+        sys.path.insert(0, str(BASE_DIR))
+        measure(int(sys.argv[2]))
+    else:
+        main()
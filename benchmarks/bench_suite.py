@@ -0,0 +1,230 @@
+"""
+Benchmark suite for the analyzer hot path.
+
+For each dataset size (deterministic events from the log_sender personas, spread over
+size / --events-per-source distinct IPs) a fresh interpreter ingests the events through
+analyze_log_entry into a throwaway SQLite database and records the metrics below. Each event is
+stamped with the arrival time the dataset's per-event delays imply, as the tests' replay() does,
+so the timing rules and the score decay see realistic request spacing.
+
+    ingest.events_per_sec           higher is better
+    ingest.queries_per_event        lower is better
+    ingest.active.events_per_sec    the same two for events whose source was still active, i.e.
+    ingest.active.queries_per_event the full rule and correlation path
+    ingest.blocked.events_per_sec   ... and for events that took the blocked-source early return
+    ingest.blocked.queries_per_event
+    ingest.active_events            how many events took the full path (informational)
+    ingest.peak_rss_mb              lower is better
+    dashboard.total_ms              lower is better (median of --repeats calls to dashboard_data)
+    dashboard.query_<hash>_ms       lower is better, one per SQL query dashboard_data runs, keyed by
+                                    a hash of its SQL so --compare always pairs up the same query
+
+    python benchmarks/bench_suite.py --sizes 10000 100000 1000000 --output results.json
+    python benchmarks/bench_suite.py --sizes 10000 --compare results.json --threshold 0.15
+
+With --compare the run exits with status 1 if any metric is worse than the baseline by more
+than the threshold (a fraction, 0.15 = 15%). Timings under 1 ms on both sides are not compared.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+HIGHER_IS_BETTER = {'ingest.events_per_sec', 'ingest.active.events_per_sec', 'ingest.blocked.events_per_sec'}
+INFORMATIONAL = {'ingest.active_events'}  # Reported, never flagged as a regression
+NOISE_FLOOR_MS = 1.0  # Timings below this on both sides are too noisy to flag
+
+
+class _QueryRecorder:
+    """connection.execute_wrapper hook that counts queries and optionally times each one."""
+
+    def __init__(self, keep=False):
+        self.count = 0
+        self.keep = keep
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if self.keep:
+                self.queries.append((sql, time.perf_counter() - started))
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _query_label(sql, seen):
+    # Stable across runs and commits as long as the query itself doesn't change
+    label = f"dashboard.query_{hashlib.sha1(sql.encode('utf-8')).hexdigest()[:8]}"
+    seen[label] = seen.get(label, 0) + 1
+    return label if seen[label] == 1 else f"{label}_{seen[label]}"
+
+
+def measure(size, seed, repeats, events_per_source):
+    """Runs inside the child interpreter; prints one JSON object of metrics."""
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+    from datetime import timedelta
+    from types import SimpleNamespace
+    from unittest import mock
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.utils import timezone
+    from analyzer.codec import LogEvent
+    from analyzer.models import ThreatSource
+    from analyzer.services import analyze_log_entry
+    from analyzer.views import dashboard_data
+    from benchmarks.datasets import generate_events
+
+    # Only the analysis is timed and counted; the status lookups that classify each event are not
+    metrics = {}
+    recorder = _QueryRecorder()
+    elapsed = {'active': 0.0, 'blocked': 0.0}
+    queries = {'active': 0, 'blocked': 0}
+    events = {'active': 0, 'blocked': 0}
+    blocked = set()
+    received_at = timezone.now()
+    for log_data, delay in generate_events(size, seed, sources=max(1, size // events_per_source)):
+        event = LogEvent.from_dict(log_data)
+        event.received_at = received_at
+        received_at += timedelta(seconds=delay)
+        if event.ip not in blocked and ThreatSource.objects.filter(ip_address=event.ip, status='blocked').exists():
+            blocked.add(event.ip)
+        path = 'blocked' if event.ip in blocked else 'active'
+
+        before = recorder.count
+        with connection.execute_wrapper(recorder):
+            started = time.perf_counter()
+            analyze_log_entry(event)
+            elapsed[path] += time.perf_counter() - started
+        queries[path] += recorder.count - before
+        events[path] += 1
+
+    metrics['ingest.events_per_sec'] = size / sum(elapsed.values())
+    metrics['ingest.queries_per_event'] = sum(queries.values()) / size
+    for path in ('active', 'blocked'):
+        if events[path]:
+            metrics[f'ingest.{path}.events_per_sec'] = events[path] / elapsed[path]
+            metrics[f'ingest.{path}.queries_per_event'] = queries[path] / events[path]
+    metrics['ingest.active_events'] = events['active']
+    metrics['ingest.peak_rss_mb'] = _peak_rss_mb()
+
+    request = RequestFactory().get('/api/dashboard-data/')
+    request.user = SimpleNamespace(is_authenticated=True)
+    totals, per_query, sql_text = [], {}, {}
+    # The dashboard looks at the 24 hours up to the last ingested event
+    with mock.patch('django.utils.timezone.now', lambda: received_at):
+        for _ in range(repeats):
+            recorder = _QueryRecorder(keep=True)
+            started = time.perf_counter()
+            with connection.execute_wrapper(recorder):
+                dashboard_data(request)
+            totals.append(time.perf_counter() - started)
+            seen = {}
+            for sql, duration in recorder.queries:
+                label = _query_label(sql, seen)
+                per_query.setdefault(label, []).append(duration)
+                sql_text[f'{label}_ms'] = sql
+    metrics['dashboard.total_ms'] = statistics.median(totals) * 1000
+    for label, durations in per_query.items():
+        metrics[f'{label}_ms'] = statistics.median(durations) * 1000
+
+    print(json.dumps({'metrics': metrics, 'queries': sql_text}))
+
+
+def run_size(size, seed, repeats, events_per_source):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SQLITE_PATH=os.path.join(tmp, 'bench.sqlite3'), ANALYZER_SHARDS='0')
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'fixit_project.settings')
+        env.setdefault('SECRET_KEY', 'benchmark')
+        result = subprocess.run(
+            [sys.executable, __file__, '--_child', str(size), str(seed), str(repeats), str(events_per_source)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+        )
+    if result.returncode != 0:
+        raise SystemExit(f"Benchmark for {size} events failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, threshold):
+    """Returns a list of human-readable regressions beyond the threshold."""
+    regressions = []
+    for size, metrics in current['results'].items():
+        for name, value in metrics.items():
+            if name in INFORMATIONAL:
+                continue
+            old = baseline.get('results', {}).get(size, {}).get(name)
+            if not old:
+                continue
+            if name.endswith('_ms') and max(old, value) < NOISE_FLOOR_MS:
+                continue
+            change = (value - old) / old
+            worse = -change if name in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append(f"{size} events, {name}: {old:.3f} -> {value:.3f} ({worse:+.1%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=5, help="dashboard_data calls per size")
+    parser.add_argument('--events-per-source', type=int, default=5, help="Average events per source IP")
+    parser.add_argument('--output', help="Write results JSON here")
+    parser.add_argument('--compare', help="Baseline results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'seed': args.seed, 'events_per_source': args.events_per_source, 'python': platform.python_version(), 'machine': platform.machine()},
+        'results': {},
+        'queries': {},
+    }
+    for size in args.sizes:
+        child = run_size(size, args.seed, args.repeats, args.events_per_source)
+        report['results'][str(size)] = child['metrics']
+        report['queries'].update(child['queries'])
+        for name, value in child['metrics'].items():
+            print(f"{size:>9}  {name:<34} {value:>12.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--_child':
+        sys.path.insert(0, str(BASE_DIR))
+        measure(*map(int, sys.argv[2:]))
+    else:
+        main()
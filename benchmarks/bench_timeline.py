@@ -0,0 +1,170 @@
+"""
+Measures source_timeline latency on a large table: p50/p95 of one page (at random depths) and of summary=1.
+
+Seeds a throwaway SQLite database in a temp directory with --rows log entries spread over --ips sources,
+--target-rows of them and --target-anomalies anomalies belonging to the source being paged. A source stops
+collecting anomalies once it is blocked, so a few hundred is already generous; raise it to stress the
+summary's reason counts and score history. Timestamps repeat in runs so page boundaries land on ties.
+The query plan of each page query, with its parameters bound, is printed next to the numbers so a full
+scan or a lost index range is visible.
+
+    python benchmarks/bench_timeline.py --rows 10000000 --target-rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fixit_project.settings')
+
+TARGET_IP = '10.255.255.254'
+INSERT_BATCH = 50000
+TIES = 3  # Consecutive rows sharing one timestamp
+
+
+def _ts(value):
+    # How Django stores an aware datetime in SQLite: naive UTC text
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def seed(rows, target_rows, ips, target_anomalies, seed):
+    from django.db import connection, transaction
+    from analyzer.models import ThreatSource
+
+    rng = random.Random(seed)
+    sources = {TARGET_IP: ThreatSource.objects.create(ip_address=TARGET_IP, country='XX', threat_score=90).id}
+    noise_ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(1, ips)]
+    for ip in noise_ips:
+        sources[ip] = ThreatSource.objects.create(ip_address=ip, country='XX').id
+
+    start = datetime.now(dt_timezone.utc) - timedelta(days=30)
+    step = timedelta(days=30) / rows
+    log_sql = ("INSERT INTO analyzer_logentry (threat_source_id, ip_address, country, url, status_code, user_agent, timestamp, time_delta_ms) "
+               "VALUES (%s, %s, 'XX', %s, 200, 'bench', %s, 1000)")
+    anomaly_sql = ("INSERT INTO analyzer_anomaly (threat_source_id, timestamp, reason, score_added, attacked_url, details, log_entry) "
+                   "VALUES (%s, %s, 'Path Scanning', 5, %s, '', '')")
+    logs, anomalies = [], []
+    target_left = target_rows
+    anomaly_every = max(1, target_rows // target_anomalies) if target_anomalies else 0
+    with connection.cursor() as cursor:
+        for index in range(rows):
+            # Target rows are spread evenly through the timeline, noise fills the rest
+            is_target = target_left and rng.random() < target_left / (rows - index)
+            ip = TARGET_IP if is_target else rng.choice(noise_ips)
+            timestamp = _ts(start + step * (index - index % TIES))
+            url = f"/api/accounts/{rng.randrange(10000)}"
+            logs.append((sources[ip], ip, url, timestamp))
+            if is_target:
+                target_left -= 1
+                if anomaly_every and target_left % anomaly_every == 0:
+                    anomalies.append((sources[ip], timestamp, url))
+            if len(logs) >= INSERT_BATCH:
+                with transaction.atomic():
+                    cursor.executemany(log_sql, logs)
+                    cursor.executemany(anomaly_sql, anomalies)
+                logs, anomalies = [], []
+        with transaction.atomic():
+            cursor.executemany(log_sql, logs)
+            cursor.executemany(anomaly_sql, anomalies)
+        cursor.execute("ANALYZE")
+
+
+def percentiles(durations):
+    durations = sorted(durations)
+    return statistics.median(durations) * 1000, durations[int(len(durations) * 0.95) - 1] * 1000
+
+
+def query_plans(threat, cursor):
+    """EXPLAIN QUERY PLAN for each page query, with its parameters bound as they are when it really runs."""
+    from django.db import connection
+    from analyzer.timeline import get_timeline_page
+
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        get_timeline_page(threat, cursor)
+    plans = []
+    with connection.cursor() as db:
+        for sql, params in queries:
+            db.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plans.append((sql, [row[-1] for row in db.fetchall()]))
+    return plans
+
+
+def measure(samples, summary_samples, page_size):
+    from analyzer.models import LogEntry, ThreatSource
+    from analyzer.timeline import ANOMALY_RANK, LOG_RANK, encode_cursor, get_timeline_page, get_timeline_summary
+
+    threat = ThreatSource.objects.get(ip_address=TARGET_IP)
+    rows = list(LogEntry.objects.filter(ip_address=TARGET_IP).order_by('?').values_list('timestamp', 'id')[:samples])
+    cursors = [None] + [encode_cursor(timestamp, LOG_RANK, pk) for timestamp, pk in rows]
+
+    page = []
+    for cursor in cursors:
+        started = time.perf_counter()
+        get_timeline_page(threat, cursor, page_size)
+        page.append(time.perf_counter() - started)
+
+    summary = []
+    for _ in range(summary_samples):
+        started = time.perf_counter()
+        get_timeline_summary(threat)
+        summary.append(time.perf_counter() - started)
+    # Both cursor ranks, since each turns the other stream's keyset predicate into a different shape
+    anomaly_at, anomaly_id = threat.anomalies.order_by('?').values_list('timestamp', 'id').first()
+    plans = {
+        'log cursor': query_plans(threat, cursors[-1]),
+        'anomaly cursor': query_plans(threat, encode_cursor(anomaly_at, ANOMALY_RANK, anomaly_id)),
+    }
+    return percentiles(page), percentiles(summary), plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="Log entries in the table")
+    parser.add_argument('--target-rows', type=int, default=100000, help="Of which belong to the paged source")
+    parser.add_argument('--ips', type=int, default=1000, help="Distinct sources in the table")
+    parser.add_argument('--target-anomalies', type=int, default=200, help="Anomalies of the paged source")
+    parser.add_argument('--samples', type=int, default=200, help="Pages fetched at random depths")
+    parser.add_argument('--summary-samples', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SQLITE_PATH'] = os.path.join(tmp, 'bench.sqlite3')
+
+        import django
+        from django.core.management import call_command
+        django.setup()
+        call_command('migrate', verbosity=0)
+
+        started = time.perf_counter()
+        seed(args.rows, args.target_rows, args.ips, args.target_anomalies, args.seed)
+        print(f"Seeded {args.rows} logs ({args.target_rows} for {TARGET_IP}) in {time.perf_counter() - started:.0f}s\n")
+
+        (page_p50, page_p95), (summary_p50, summary_p95), plans = measure(args.samples, args.summary_samples, args.page_size)
+        print(f"{'query':<10}  {'p50 ms':>8}  {'p95 ms':>8}")
+        print(f"{'page':<10}  {page_p50:>8.2f}  {page_p95:>8.2f}")
+        print(f"{'summary':<10}  {summary_p50:>8.2f}  {summary_p95:>8.2f}")
+
+        for label, queries in plans.items():
+            print(f"\nPage query plans, {label}:")
+            for sql, plan in queries:
+                table = 'analyzer_anomaly' if 'analyzer_anomaly' in sql else 'analyzer_logentry'
+                print(f"  {table}: {'; '.join(plan)}")
+
+
+if __name__ == '__main__':
+    main()
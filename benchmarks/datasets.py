@@ -0,0 +1,59 @@
+"""
+Deterministic synthetic log streams built from the log_sender.py personas.
+
+The same seed always yields the same events in the same order, so benchmark runs and
+regression tests are comparable across machines and commits.
+"""
+import random
+
+import log_sender
+
+# Delay (seconds) log_sender waits after each persona's request
+ATTACKER_DELAY = 0.15
+NORMAL_DELAY = (1, 3)
+
+
+def source_ips(count):
+    """`count` distinct synthetic addresses in 10.0.0.0/8, always the same ones in the same order."""
+    return [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(1, count + 1)]
+
+
+def generate_events(count, seed=42, sources=None):
+    """Yields (log_data, delay_seconds) pairs, picking IPs, actions and user agents like log_sender.
+
+    By default the events come from log_sender's own IPS. With `sources`, they are spread over that many
+    distinct addresses instead, source i behaving like the (i mod len(IPS))-th log_sender IP, so per-source
+    state and shard routing see a realistic key space rather than a couple of dozen IPs.
+    """
+    rng = random.Random(seed)
+    profiles = list(log_sender.IPS)
+    ips = profiles if sources is None else source_ips(sources)
+    for _ in range(count):
+        index = rng.randrange(len(ips))
+        profile = log_sender.IPS[profiles[index % len(profiles)]]
+        persona = profile['persona']
+        action = rng.choice(log_sender.PERSONA_ACTIONS[persona])
+        log_data = {
+            "ip": ips[index],
+            "country": profile['country'],
+            "url": action['url'],
+            "status_code": action['status'],
+            "post_data": action['post_data'],
+            "user_agent": rng.choice(log_sender.USER_AGENTS[persona]),
+        }
+        delay = ATTACKER_DELAY if persona != 'normal' else rng.uniform(*NORMAL_DELAY)
+        yield log_data, delay
+
+
+def persona_events(persona, rounds=1):
+    """Every action of one persona in declaration order, `rounds` times, with its log_sender delay."""
+    delay = ATTACKER_DELAY if persona != 'normal' else sum(NORMAL_DELAY) / 2
+    user_agent = log_sender.USER_AGENTS[persona][0]
+    for _ in range(rounds):
+        for action in log_sender.PERSONA_ACTIONS[persona]:
+            yield {
+                "url": action['url'],
+                "status_code": action['status'],
+                "post_data": action['post_data'],
+                "user_agent": user_agent,
+            }, delay
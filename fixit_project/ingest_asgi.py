@@ -0,0 +1,13 @@
+"""
+ASGI config for the ingest-only process profile of fixit_project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fixit_project.ingest_settings')
+
+application = get_asgi_application()
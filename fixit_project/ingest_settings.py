@@ -0,0 +1,23 @@
+"""
+Settings for the ingest-only process profile.
+
+Serves nothing but /api/logs/: no admin, sessions, auth, messages or templates, and an empty
+middleware chain. Run it as a separate pool next to the full site, e.g.
+
+    gunicorn fixit_project.ingest_wsgi:application
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "analyzer",
+]
+
+# log_receiver is csrf_exempt and stateless, so none of the full stack applies to it
+MIDDLEWARE = []
+
+ROOT_URLCONF = "fixit_project.ingest_urls"
+
+TEMPLATES = []
+
+WSGI_APPLICATION = "fixit_project.ingest_wsgi.application"
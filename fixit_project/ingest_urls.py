@@ -0,0 +1,6 @@
+from django.urls import path
+from analyzer.ingest import log_receiver
+
+urlpatterns = [
+    path('api/logs/', log_receiver, name='log_receiver'),
+]
@@ -68,7 +68,13 @@ WSGI_APPLICATION = "fixit_project.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get('SQLITE_PATH', BASE_DIR / "db.sqlite3"),
+        # Shard workers write concurrently: take the write lock up front and let readers use WAL
+        "OPTIONS": {
+            "timeout": 20,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA journal_mode=WAL;",
+        },
     }
 }
 
@@ -115,3 +121,13 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_URL = 'admin:login'
+
+# --- Analyzer runtime ---
+# Number of shard worker processes; 0 analyzes every log inline in the request.
+# The shard pool runs once per host (`manage.py run_shards`) and front ends reach it over ANALYZER_SHARD_SOCKET.
+ANALYZER_SHARDS = int(os.environ.get('ANALYZER_SHARDS', 0))
+ANALYZER_SHARD_BATCH_SIZE = int(os.environ.get('ANALYZER_SHARD_BATCH_SIZE', 200))
+ANALYZER_SHARD_QUEUE_SIZE = int(os.environ.get('ANALYZER_SHARD_QUEUE_SIZE', 10000))
+ANALYZER_SHARD_SOCKET = os.environ.get('ANALYZER_SHARD_SOCKET', str(BASE_DIR / 'analyzer-shards.sock'))
+# Cross-IP campaign clustering on source fingerprints
+ANALYZER_CORRELATION = os.environ.get('ANALYZER_CORRELATION', 'True') == 'True'